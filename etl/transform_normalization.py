@@ -19,6 +19,11 @@ import pandas as pd
 import numpy as np
 from typing import List, Dict, Optional
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 
 # Feature categorization for normalization
 BINARY_FEATURES = [
@@ -35,6 +40,10 @@ VOLATILITY_SCALED_FEATURES = [
 
 # All other features are continuous and should be z-scored
 
+# Set views for O(1) membership tests
+_BINARY_SET = frozenset(BINARY_FEATURES)
+_NON_ZSCORE_SET = frozenset(BINARY_FEATURES + VOLATILITY_SCALED_FEATURES)
+
 
 def zscore_rolling(series: pd.Series, window: int = 252) -> pd.Series:
     """
@@ -71,11 +80,149 @@ def clip_feature(series: pd.Series, clip_min: float, clip_max: float) -> pd.Seri
     return series.clip(clip_min, clip_max)
 
 
+def _rolling_zscore_clip(x, window, min_periods, eps, clip_min, clip_max, out):
+    """
+    Fused rolling z-score + clip kernel (one pass, writes into out).
+    
+    Matches zscore_rolling followed by clip_feature: NaNs are skipped in
+    the window, std uses ddof=1. Values are shifted by the first finite
+    observation to keep the running sum of squares well conditioned.
+    """
+    n = x.shape[0]
+    shift = 0.0
+    for i in range(n):
+        if not np.isnan(x[i]):
+            shift = x[i]
+            break
+    
+    s = 0.0
+    ss = 0.0
+    cnt = 0
+    for i in range(n):
+        v = x[i] - shift
+        if not np.isnan(v):
+            s += v
+            ss += v * v
+            cnt += 1
+        if i >= window:
+            old = x[i - window] - shift
+            if not np.isnan(old):
+                s -= old
+                ss -= old * old
+                cnt -= 1
+        
+        if np.isnan(v) or cnt < min_periods or cnt < 2:
+            out[i] = np.nan
+            continue
+        
+        mean = s / cnt
+        var = (ss - s * mean) / (cnt - 1)
+        if var < 0.0:
+            var = 0.0
+        z = (v - mean) / (np.sqrt(var) + eps)
+        if z < clip_min:
+            z = clip_min
+        elif z > clip_max:
+            z = clip_max
+        out[i] = z
+
+
+if njit is not None:
+    # cache=True persists compiled kernels to __pycache__ across runs
+    _rolling_zscore_clip = njit(cache=True)(_rolling_zscore_clip)
+
+    @njit(parallel=True, cache=True)
+    def _zscore_all(X, symbol_offsets, window, min_periods, eps, clip_min, clip_max, out):
+        """Run _rolling_zscore_clip over every (symbol slice, column) pair in parallel."""
+        n_cols = X.shape[1]
+        n_tasks = (len(symbol_offsets) - 1) * n_cols
+        for t in prange(n_tasks):
+            s = t // n_cols
+            j = t % n_cols
+            lo = symbol_offsets[s]
+            hi = symbol_offsets[s + 1]
+            _rolling_zscore_clip(X[lo:hi, j], window, min_periods, eps, clip_min, clip_max, out[lo:hi, j])
+
+
+def zscore_clip(series: pd.Series, window: int, clip_min: float, clip_max: float) -> pd.Series:
+    """
+    Rolling z-score and clip in a single pass.
+    
+    Uses the Numba kernel when numba is installed, otherwise falls back
+    to zscore_rolling + clip_feature.
+    
+    Args:
+        series: Feature values (chronological)
+        window: Rolling window size
+        clip_min: Minimum value
+        clip_max: Maximum value
+    
+    Returns:
+        Z-scored, clipped float32 series
+    """
+    if njit is None:
+        zscore = zscore_rolling(series, window)
+        return clip_feature(zscore, clip_min, clip_max).astype(np.float32)
+    
+    x = series.to_numpy(dtype=np.float64)
+    out = np.empty(len(x), dtype=np.float32)
+    _rolling_zscore_clip(x, window, window // 2, 1e-9, clip_min, clip_max, out)
+    return pd.Series(out, index=series.index, name=series.name)
+
+
+def zscore_clip_by_symbol(
+    values: np.ndarray,
+    symbols: np.ndarray,
+    window: int,
+    clip_min: float,
+    clip_max: float
+) -> np.ndarray:
+    """
+    Rolling z-score + clip of a feature matrix, computed independently per symbol.
+    
+    Rows are grouped by symbol with a stable sort (so each symbol keeps its
+    chronological order), normalized slice by slice, and scattered back to
+    the original row order. With numba installed all (symbol, column)
+    slices run in parallel.
+    
+    Args:
+        values: 2D array (n_rows, n_features)
+        symbols: Symbol label per row (n_rows,)
+        window: Rolling window size
+        clip_min: Minimum value
+        clip_max: Maximum value
+    
+    Returns:
+        float32 array with the same shape as values
+    """
+    n_rows, n_cols = values.shape
+    codes, _ = pd.factorize(symbols)
+    order = np.argsort(codes, kind='stable')
+    boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+    symbol_offsets = np.concatenate(([0], boundaries, [n_rows])).astype(np.int64)
+    
+    # Column-major so each (symbol, column) slice is contiguous
+    X = np.asfortranarray(values[order], dtype=np.float64)
+    out = np.empty((n_rows, n_cols), dtype=np.float32, order='F')
+    
+    if njit is not None:
+        _zscore_all(X, symbol_offsets, window, window // 2, 1e-9, clip_min, clip_max, out)
+    else:
+        for lo, hi in zip(symbol_offsets[:-1], symbol_offsets[1:]):
+            for j in range(n_cols):
+                out[lo:hi, j] = zscore_clip(pd.Series(X[lo:hi, j]), window, clip_min, clip_max).to_numpy()
+    
+    result = np.empty_like(out)
+    result[order] = out
+    return result
+
+
 def normalize_features(
     features_df: pd.DataFrame,
     continuous_features: Optional[List[str]] = None,
     window: int = 252,
-    clip_continuous: float = 5.0
+    clip_continuous: float = 5.0,
+    symbol_col: str = 'symbol'
 ) -> pd.DataFrame:
     """
     Normalize features for regression modeling.
@@ -90,28 +237,37 @@ def normalize_features(
         continuous_features: List of continuous feature names (auto-detect if None)
         window: Rolling window for z-scoring (default 252 trading days)
         clip_continuous: Clipping threshold for continuous features (default ±5)
+        symbol_col: Column identifying the symbol; rolling windows never cross
+            symbols. If absent, the whole frame is treated as one series.
     
     Returns:
-        DataFrame with normalized features
+        DataFrame with normalized features (continuous features as float32)
     """
-    result = features_df.copy()
+    # Shallow copy: columns are replaced below, never mutated in place
+    result = features_df.copy(deep=False)
     
     # Auto-detect continuous features if not provided
     if continuous_features is None:
         all_features = [c for c in features_df.columns 
                        if c not in ['date', 'symbol', 'asset_id']]
         continuous_features = [f for f in all_features 
-                              if f not in BINARY_FEATURES + VOLATILITY_SCALED_FEATURES]
-    
-    # Normalize continuous features
-    for feature in continuous_features:
-        if feature in result.columns:
-            # Z-score with rolling window
-            result[feature] = zscore_rolling(result[feature], window)
-            
-            # Clip to ±clip_continuous
-            result[feature] = clip_feature(result[feature], -clip_continuous, clip_continuous)
-    
+                              if f not in _NON_ZSCORE_SET]
+    
+    # Normalize continuous features: rolling z-score, clip to ±clip_continuous
+    # (emitted as float32: ±5 range needs no more precision)
+    present = [f for f in continuous_features if f in result.columns]
+    if present:
+        if symbol_col in result.columns:
+            symbols = result[symbol_col].to_numpy()
+        else:
+            symbols = np.zeros(len(result), dtype=np.int64)
+        normalized = zscore_clip_by_symbol(
+            result[present].to_numpy(dtype=np.float64), symbols,
+            window, -clip_continuous, clip_continuous
+        )
+        for i, feature in enumerate(present):
+            result[feature] = normalized[:, i]
+
     # Clip overnight_share to [-1, 1] (should already be bounded, but enforce)
     if 'overnight_share' in result.columns:
         result['overnight_share'] = clip_feature(result['overnight_share'], -1.0, 1.0)
@@ -170,22 +326,36 @@ def validate_feature_distributions(features_df: pd.DataFrame) -> Dict[str, Dict]
     Returns:
         Dictionary with validation results per feature
     """
-    results = {}
+    cols = [c for c in features_df.select_dtypes(include=[np.number]).columns if c != 'date']
+    
+    # One pass over the numeric matrix instead of a Series round-trip per column
+    M = features_df[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = ~np.isnan(M)
+    count = valid.sum(axis=0)
+    is_binary = np.array([c in _BINARY_SET for c in cols], dtype=bool)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, M, 0.0).sum(axis=0) / count
+        dev = np.where(valid, M - mean, 0.0)
+        # Sample std (ddof=1) is undefined below two values: NaN, as pandas gives
+        std = np.where(count > 1, np.sqrt((dev * dev).sum(axis=0) / (count - 1)), np.nan)
+        pct_null = (len(M) - count) / len(M) * 100
+        outliers = np.where(is_binary, 0, (np.abs(M) > 5).sum(axis=0))
+    
+    # fmin/fmax skip NaN and give NaN for all-NaN columns, like Series.min/max
+    col_min = np.fmin.reduce(M, axis=0) if len(M) else np.full(len(cols), np.nan)
+    col_max = np.fmax.reduce(M, axis=0) if len(M) else np.full(len(cols), np.nan)
     
-    for col in features_df.select_dtypes(include=[np.number]).columns:
-        if col in ['date']:
-            continue
-        
-        series = features_df[col].dropna()
-        
+    results = {}
+    for j, col in enumerate(cols):
         results[col] = {
-            'mean': series.mean(),
-            'std': series.std(),
-            'min': series.min(),
-            'max': series.max(),
-            'pct_null': features_df[col].isna().mean() * 100,
-            'outliers_beyond_5': (series.abs() > 5).sum() if col not in BINARY_FEATURES else 0,
-            'is_binary': col in BINARY_FEATURES
+            'mean': mean[j],
+            'std': std[j],
+            'min': col_min[j],
+            'max': col_max[j],
+            'pct_null': pct_null[j],
+            'outliers_beyond_5': outliers[j],
+            'is_binary': bool(is_binary[j])
         }
     
     return results
@@ -286,3 +456,34 @@ DEFAULT_CLIP_RULES = {
     'hy_oas_change_lag1': (-5, 5),
     'yield_curve_slope_lag1': (-5, 5),
 }
+
+# DEFAULT_CLIP_RULES frozen into aligned arrays for vectorized clipping
+_CLIP_COLS = list(DEFAULT_CLIP_RULES.keys())
+_CLIP_LO = np.array([v[0] for v in DEFAULT_CLIP_RULES.values()], dtype=np.float32)
+_CLIP_HI = np.array([v[1] for v in DEFAULT_CLIP_RULES.values()], dtype=np.float32)
+
+
+def clip_all(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply DEFAULT_CLIP_RULES to every matching column in one np.clip pass.
+    
+    Columns missing from df are skipped. NaNs pass through unchanged.
+    
+    Args:
+        df: DataFrame with feature columns
+    
+    Returns:
+        DataFrame with clipped features (float32)
+    """
+    present = np.array([c in df.columns for c in _CLIP_COLS], dtype=bool)
+    cols = [c for c, p in zip(_CLIP_COLS, present) if p]
+    
+    result = df.copy()
+    if not cols:
+        return result
+    
+    vals = result[cols].to_numpy(dtype=np.float32, copy=True)
+    np.clip(vals, _CLIP_LO[present], _CLIP_HI[present], out=vals)
+    result[cols] = vals
+    
+    return result
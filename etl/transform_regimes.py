@@ -130,7 +130,8 @@ def compute_all_regimes(
     Returns:
         DataFrame with regime flags added
     """
-    result = features_df.copy()
+    # Shallow copy: regime columns are only added, inputs are untouched
+    result = features_df.copy(deep=False)
     
     # High vol regime
     if vix_col in result.columns:
@@ -8,6 +8,8 @@ load_dotenv()
 
 from etl.supabase_client import SupabaseDB
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 import json
 
 def export_dataset():
@@ -62,21 +64,37 @@ def export_dataset():
         .eq('asset_type', 'ETF')\
         .execute()
     assets_df = pd.DataFrame(assets_result.data)
-    assets_map = dict(zip(assets_df['id'], assets_df['symbol']))
+    # Index on the ids as returned (uuid strings); the trailing None catches
+    # unknown ids, for which get_indexer returns -1
+    asset_index = pd.Index(assets_df['id'])
+    symbols_arr = np.append(assets_df['symbol'].to_numpy(dtype=object), None)
     print(f"   ✅ Assets: {len(assets_df)} symbols")
     
     print("\nUnpacking feature JSON...")
     # Unpack JSON to columns
     features_unpacked = pd.json_normalize(features_df['feature_json'])
-    features_final = pd.concat([
-        features_df[['asset_id', 'date']], 
-        features_unpacked
-    ], axis=1)
     
     print("Merging labels + features...")
-    # Merge
-    df = labels_df.merge(features_final, on=['asset_id', 'date'], how='inner')
-    df['symbol'] = df['asset_id'].map(assets_map)
+    # Join only the keys in Arrow (native hash join), then gather rows by position
+    # so the wide/object feature columns never go through pandas' merge path
+    label_keys = pa.table({
+        'asset_id': labels_df['asset_id'],
+        'date': labels_df['date'],
+        '_l': np.arange(len(labels_df)),
+    })
+    feature_keys = pa.table({
+        'asset_id': features_df['asset_id'],
+        'date': features_df['date'],
+        '_r': np.arange(len(features_df)),
+    })
+    matches = label_keys.join(feature_keys, keys=['asset_id', 'date'], join_type='inner')
+    left_idx = matches['_l'].to_numpy()
+    right_idx = matches['_r'].to_numpy()
+    df = pd.concat([
+        labels_df.take(left_idx).reset_index(drop=True),
+        features_unpacked.take(right_idx).reset_index(drop=True)
+    ], axis=1)
+    df['symbol'] = symbols_arr[asset_index.get_indexer(df['asset_id'])]
     
     # Drop asset_id, reorder columns
     df = df.drop('asset_id', axis=1)
@@ -8,6 +8,7 @@ load_dotenv()
 
 from etl.supabase_client import SupabaseDB
 import pandas as pd
+import numpy as np
 import json
 
 def export_dataset_5d():
@@ -59,6 +60,10 @@ def export_dataset_5d():
     print("3/3 Fetching assets...")
     assets_result = db.client.table('assets').select('id, symbol').execute()
     assets_df = pd.DataFrame(assets_result.data)
+    # Index on the ids as returned (uuid strings); the trailing None catches
+    # unknown ids, for which get_indexer returns -1
+    asset_index = pd.Index(assets_df['id'])
+    symbols_arr = np.append(assets_df['symbol'].to_numpy(dtype=object), None)
     print(f"   ✅ Assets: {len(assets_df)} symbols\n")
     
     print("Unpacking feature JSON...")
@@ -70,9 +75,9 @@ def export_dataset_5d():
     # Merge labels with features
     merged = labels_df.merge(features_df, on=['asset_id', 'date'], how='inner')
     
-    # Merge with asset symbols
-    merged = merged.merge(assets_df, left_on='asset_id', right_on='id', how='left')
-    merged = merged.drop(columns=['asset_id', 'id'])
+    # Map asset ids to symbols
+    merged['symbol'] = symbols_arr[asset_index.get_indexer(merged['asset_id'])]
+    merged = merged.drop(columns=['asset_id'])
     
     print(f"\n✅ Dataset ready!")
     print(f"   Shape: {merged.shape}")
@@ -1,7 +1,7 @@
 """Generate predictions for dates 2025-12-06 through 2025-12-16."""
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv
 import pandas as pd
 
@@ -67,20 +67,15 @@ def generate_missing_predictions():
     
     # Check what feature dates we have
     available_dates = [row['date'] for row in features_result.data]
-    missing_prediction_dates = []
     
     # Determine which dates need predictions
     start_date = datetime(2025, 12, 6)
     end_date = datetime(2025, 12, 16)
-    current = start_date
     
     existing_pred_dates = set(row['date'] for row in pred_result.data)
     
-    while current <= end_date:
-        date_str = current.strftime('%Y-%m-%d')
-        if date_str not in existing_pred_dates:
-            missing_prediction_dates.append(date_str)
-        current += timedelta(days=1)
+    all_dates = pd.date_range(start_date, end_date, freq='D').strftime('%Y-%m-%d')
+    missing_prediction_dates = sorted(set(all_dates) - existing_pred_dates)
     
     print(f"\n=== Dates Needing Predictions ===")
     if missing_prediction_dates:
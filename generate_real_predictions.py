@@ -4,72 +4,149 @@ Uses trained XGBoost models instead of placeholder predictions.
 """
 import os
 import sys
-import json
+import functools
 import joblib
 import numpy as np
 import pandas as pd
+import xgboost as xgb
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pandas_market_calendars as mcal
 
 load_dotenv()
 sys.path.insert(0, os.path.dirname(__file__))
+# Preprocessor pickles reference the 'src' package under ml/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'ml'))
 
 from etl.supabase_client import SupabaseDB
+# Bound here too so model.pkl files pickled as __main__.XGBWrapper still load
+from src.utils.xgb_wrapper import XGBWrapper
+
+try:
+    import tl2cgen
+except ImportError:
+    tl2cgen = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 # All symbols to process
 SYMBOLS = ['SPY', 'QQQ', 'IWM', 'DIA']
 
-def fetch_latest_features(db: SupabaseDB, symbol: str) -> pd.DataFrame:
+# XGBoost class index -> label (matches train_xgboost)
+XGB_LABEL_MAPPING = {0: -1, 1: 1}
+
+# NYSE calendar, built once per process
+_NYSE = mcal.get_calendar('NYSE')
+
+
+class _LabelMappedXGBModel:
+    """
+    Base for exported XGBoost models with the XGBWrapper interface.
+    Subclasses provide predict_proba; predict maps its argmax to labels.
+    """
+    def __init__(self, label_mapping: dict):
+        self.label_mapping = label_mapping
+        self._lut = np.array([label_mapping[i] for i in sorted(label_mapping)])
+        self.classes_ = self._lut
+    
+    def predict(self, X):
+        preds_mapped = self.predict_proba(X).argmax(axis=1)
+        return self._lut[preds_mapped]
+
+
+class CompiledXGBModel(_LabelMappedXGBModel):
+    """
+    Treelite-compiled XGBoost model (model.so) with the XGBWrapper interface.
+    Single-row predictions skip XGBoost's Python predictor entirely.
+    """
+    def __init__(self, lib_path: str, label_mapping: dict):
+        # One thread: per-row inference doesn't benefit from spawning workers
+        self.predictor = tl2cgen.Predictor(lib_path, nthread=1)
+        super().__init__(label_mapping)
+    
+    def predict_proba(self, X):
+        dmat = tl2cgen.DMatrix(np.asarray(X, dtype=np.float32), dtype='float32')
+        p_up = self.predictor.predict(dmat).reshape(-1)
+        return np.column_stack([1.0 - p_up, p_up])
+
+
+class OnnxXGBModel(_LabelMappedXGBModel):
+    """
+    ONNX export of an XGBoost model (model.onnx) run through onnxruntime,
+    with the XGBWrapper interface.
+    """
+    def __init__(self, onnx_path: str, label_mapping: dict):
+        sess_options = ort.SessionOptions()
+        # Single-row inference shouldn't spawn intra-op threads
+        sess_options.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=sess_options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        super().__init__(label_mapping)
+    
+    def predict_proba(self, X):
+        # Outputs are [label, probabilities]
+        outputs = self.session.run(None, {self.input_name: np.asarray(X, dtype=np.float32)})
+        return outputs[1]
+
+
+class BoosterXGBModel(_LabelMappedXGBModel):
+    """
+    XGBoost Booster loaded from its native model.ubj, with the XGBWrapper interface.
+    Avoids unpickling the sklearn wrapper and its numpy state.
+    """
+    def __init__(self, ubj_path: str, label_mapping: dict):
+        self.booster = xgb.Booster()
+        self.booster.load_model(ubj_path)
+        self.booster.set_param({'nthread': 1})
+        super().__init__(label_mapping)
+    
+    def predict_proba(self, X):
+        p_up = self.booster.inplace_predict(np.asarray(X, dtype=np.float32))
+        return np.column_stack([1.0 - p_up, p_up])
+
+
+def fetch_latest_features(db: SupabaseDB, symbols: list, feature_names: list) -> pd.DataFrame:
     """
-    Fetch the most recent features for a symbol.
-    Returns a single-row DataFrame with all features unpacked and proper dtypes.
+    Fetch the most recent features for all symbols in one RPC call.
+    The get_latest_features function (migration 016) expands feature_json
+    server-side, so rows arrive as typed arrays in feature_names order.
+    Returns a DataFrame with one row per symbol and float32 feature columns.
     """
     try:
-        # Get asset ID
-        asset_result = db.client.table('assets').select('id').eq('symbol', symbol).single().execute()
-        asset_id = asset_result.data['id']
-        
-        # Get latest feature row
-        features_result = db.client.table('features_daily')\
-            .select('date, feature_json')\
-            .eq('asset_id', asset_id)\
-            .order('date', desc=True)\
-            .limit(1)\
-            .execute()
+        result = db.client.rpc(
+            'get_latest_features',
+            {'p_symbols': symbols, 'p_features': feature_names}
+        ).execute()
         
-        if not features_result.data:
-            print(f"    No features found for {symbol}")
+        if not result.data:
+            print(f"    No features found for {symbols}")
             return None
-            
-        row = features_result.data[0]
-        date = row['date']
-        feature_json = row['feature_json']
-        
-        # Parse JSON if needed
-        if isinstance(feature_json, str):
-            feature_json = json.loads(feature_json)
         
-        # Create DataFrame with features
-        df = pd.DataFrame([feature_json])
-        df.insert(0, 'symbol', symbol)
-        df.insert(1, 'date', date)
+        # NULLs (missing or non-numeric values) become NaN
+        X = np.array([row['features'] for row in result.data], dtype=np.float32)
+        df = pd.DataFrame(X.reshape(len(result.data), len(feature_names)), columns=feature_names)
+        df.insert(0, 'symbol', [row['symbol'] for row in result.data])
+        df.insert(1, 'date', [row['date'] for row in result.data])
         
-        # Convert all feature columns to numeric (handle string types from JSON)
-        exclude_cols = ['symbol', 'date']
-        for col in df.columns:
-            if col not in exclude_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        missing = [s for s in symbols if s not in set(df['symbol'])]
+        if missing:
+            print(f"    No features found for {', '.join(missing)}")
         
         return df
         
     except Exception as e:
-        print(f"    Error fetching features for {symbol}: {e}")
+        print(f"    Error fetching features for {symbols}: {e}")
         return None
 
 
+@functools.lru_cache(maxsize=8)
 def load_model_artifacts(horizon: str, model_name: str = 'xgboost'):
-    """Load trained model and preprocessor for given horizon."""
+    """Load trained model and preprocessor for given horizon (cached per process)."""
     model_dir = f'ml/artifacts/models/{model_name}_{horizon}'
     
     model_path = os.path.join(model_dir, 'model.pkl')
@@ -81,52 +158,138 @@ def load_model_artifacts(horizon: str, model_name: str = 'xgboost'):
     if not os.path.exists(preprocessor_path):
         raise FileNotFoundError(f"Preprocessor not found: {preprocessor_path}")
     
-    model = joblib.load(model_path)
     preprocessor = joblib.load(preprocessor_path)
     
+    # Prefer the compiled tree library, ONNX, then the native booster if exported
+    # at training time; only unpickle model.pkl when none of them load
+    lib_path = os.path.join(model_dir, 'model.so')
+    onnx_path = os.path.join(model_dir, 'model.onnx')
+    ubj_path = os.path.join(model_dir, 'model.ubj')
+    if tl2cgen is not None and os.path.exists(lib_path):
+        try:
+            return CompiledXGBModel(lib_path, XGB_LABEL_MAPPING), preprocessor
+        except Exception as e:
+            print(f"    Could not load {lib_path}: {e}")
+    if ort is not None and os.path.exists(onnx_path):
+        try:
+            return OnnxXGBModel(onnx_path, XGB_LABEL_MAPPING), preprocessor
+        except Exception as e:
+            print(f"    Could not load {onnx_path}: {e}")
+    if os.path.exists(ubj_path):
+        try:
+            return BoosterXGBModel(ubj_path, XGB_LABEL_MAPPING), preprocessor
+        except Exception as e:
+            print(f"    Could not load {ubj_path}: {e}")
+    
+    model = joblib.load(model_path)
+    
     return model, preprocessor
 
 
-def predict_symbol(db: SupabaseDB, symbol: str, horizon: str, model_name: str = 'xgboost'):
-    """Generate prediction for a single symbol and horizon."""
-    
-    # 1. Fetch latest features
-    features_df = fetch_latest_features(db, symbol)
-    if features_df is None:
-        return None
-    
-    latest_date = features_df['date'].iloc[0]
-    print(f"  Latest feature date: {latest_date}")
-    
-    # 2. Find next trading day
-    nyse = mcal.get_calendar('NYSE')
-    latest_dt = pd.to_datetime(latest_date).date()
-    schedule = nyse.schedule(start_date=latest_dt, end_date=latest_dt + timedelta(days=10))
+def get_feature_names(horizons: list, model_name: str = 'xgboost') -> list:
+    """Union of the input features the horizon preprocessors keep, in first-seen order."""
+    names = {}
+    for horizon in horizons:
+        try:
+            _, preprocessor = load_model_artifacts(horizon, model_name)
+        except FileNotFoundError:
+            continue
+        names.update(dict.fromkeys(preprocessor.kept_features_))
+    return list(names)
+
+
+def get_trading_days(features_df: pd.DataFrame) -> np.ndarray:
+    """NYSE trading days covering every symbol's latest date plus a 20-day lookahead."""
+    dates = pd.to_datetime(features_df['date'])
+    schedule = _NYSE.schedule(
+        start_date=dates.min().date(),
+        end_date=dates.max().date() + timedelta(days=20)
+    )
+    return schedule.index.values.astype('datetime64[D]')
+
+
+def get_prediction_targets(features_df: pd.DataFrame, trading_days: np.ndarray) -> dict:
+    """
+    Map each row of features_df to its prediction target (next trading day).
     
-    if len(schedule) <= 1:
-        print(f"    No future trading days found after {latest_date}")
-        return None
+    Returns:
+        Dict of row index -> next trading day (ISO string); symbols with no
+        future trading day in range are left out
+    """
+    targets = {}
+    for i, symbol, latest_date in zip(features_df.index, features_df['symbol'], features_df['date']):
+        print(f"  {symbol}: latest feature date {latest_date}")
+        
+        latest_dt = np.datetime64(pd.to_datetime(latest_date).date(), 'D')
+        next_idx = np.searchsorted(trading_days, latest_dt, side='right')
+        
+        if next_idx >= len(trading_days):
+            print(f"    No future trading days found after {latest_date}")
+            continue
+        
+        targets[i] = str(trading_days[next_idx])
+        print(f"    Next trading day (prediction target): {targets[i]}")
     
-    next_trading_day = schedule.index[1].date().isoformat()
-    print(f"  Next trading day (prediction target): {next_trading_day}")
+    return targets
+
+
+def fetch_existing_predictions(
+    db: SupabaseDB,
+    symbols: list,
+    horizons: list,
+    dates: list,
+    model_name: str = 'xgboost'
+) -> set:
+    """
+    Fetch already-stored predictions for all (symbol, horizon, date) targets in one query.
     
-    # 3. Check if prediction already exists
+    Returns:
+        Set of (symbol, horizon, date) tuples
+    """
     try:
         pred_result = db.client.table('model_predictions_classification')\
-            .select('date')\
-            .eq('symbol', symbol)\
-            .eq('horizon', horizon)\
+            .select('symbol, horizon, date')\
+            .in_('symbol', symbols)\
+            .in_('horizon', horizons)\
             .eq('model_name', model_name)\
-            .eq('date', next_trading_day)\
+            .in_('date', dates)\
             .execute()
-        
-        if pred_result.data:
-            print(f"   Prediction already exists for {next_trading_day}")
-            return 0
-    except:
-        pass
+        return {(r['symbol'], r['horizon'], r['date']) for r in pred_result.data}
+    except Exception as e:
+        print(f"    Could not check existing predictions: {e}")
+        return set()
+
+
+def predict_horizon(
+    db: SupabaseDB,
+    features_df: pd.DataFrame,
+    targets: dict,
+    existing: set,
+    horizon: str,
+    model_name: str = 'xgboost'
+):
+    """
+    Generate predictions for every symbol in features_df for one horizon.
+    All symbols go through a single preprocess/predict call and a single upsert.
     
-    # 4. Load model
+    Returns:
+        Number of predictions inserted, or None on failure
+    """
+    # 1. Skip symbols that already have a prediction
+    pending = []
+    for i, next_trading_day in targets.items():
+        symbol = features_df.at[i, 'symbol']
+        if (symbol, horizon, next_trading_day) in existing:
+            print(f"  {symbol}: prediction already exists for {next_trading_day}")
+            continue
+        pending.append((i, next_trading_day))
+    
+    if not pending:
+        return 0
+    
+    batch_df = features_df.loc[[i for i, _ in pending]]
+    
+    # 2. Load model
     try:
         model, preprocessor = load_model_artifacts(horizon, model_name)
     except FileNotFoundError as e:
@@ -134,54 +297,60 @@ def predict_symbol(db: SupabaseDB, symbol: str, horizon: str, model_name: str =
         print(f"    Train models first: python train_models_{horizon}.py")
         return None
     
-    # 5. Preprocess features
+    # 3. Preprocess features
     try:
-        X_processed = preprocessor.transform(features_df, split_name='inference')
+        X_processed = np.ascontiguousarray(
+            preprocessor.transform(batch_df, split_name='inference'), dtype=np.float32
+        )
     except Exception as e:
         print(f"    Preprocessing failed: {e}")
         return None
     
-    # 6. Make prediction
+    # 4. Make predictions
     try:
         probs = model.predict_proba(X_processed)
-        pred_class = model.predict(X_processed)[0]
+        pred_classes = model.classes_[probs.argmax(axis=1)]
+    except Exception as e:
+        print(f"    Prediction failed: {e}")
+        return None
+    
+    # 5. Store predictions
+    records = []
+    for k, (i, next_trading_day) in enumerate(pending):
+        pred_class = pred_classes[k]
         
         # Binary classification: [p_down, p_up]
-        p_down = float(probs[0, 0])
-        p_up = float(probs[0, 1])
+        p_down = float(probs[k, 0])
+        p_up = float(probs[k, 1])
         confidence = max(p_down, p_up)
         margin = abs(p_up - p_down)
         
-        print(f"  Prediction: {'UP' if pred_class == 1 else 'DOWN'} (conf: {confidence:.3f}, p_up: {p_up:.3f}, p_down: {p_down:.3f})")
+        symbol = features_df.at[i, 'symbol']
+        print(f"  {symbol} prediction: {'UP' if pred_class == 1 else 'DOWN'} (conf: {confidence:.3f}, p_up: {p_up:.3f}, p_down: {p_down:.3f})")
         
-    except Exception as e:
-        print(f"    Prediction failed: {e}")
-        return None
-    
-    # 7. Store prediction
-    pred_data = {
-        'symbol': symbol,
-        'date': next_trading_day,
-        'horizon': horizon,
-        'model_name': model_name,
-        'split': 'production',
-        'y_true': None,
-        'pred_class_raw': int(pred_class),
-        'pred_class_final': int(pred_class),
-        'p_down': p_down,
-        'p_up': p_up,
-        'confidence': confidence,
-        'margin': margin
-    }
+        records.append({
+            'symbol': symbol,
+            'date': next_trading_day,
+            'horizon': horizon,
+            'model_name': model_name,
+            'split': 'production',
+            'y_true': None,
+            'pred_class_raw': int(pred_class),
+            'pred_class_final': int(pred_class),
+            'p_down': p_down,
+            'p_up': p_up,
+            'confidence': confidence,
+            'margin': margin
+        })
     
     try:
-        result = db.client.table('model_predictions_classification').upsert(
-            pred_data,
+        db.client.table('model_predictions_classification').upsert(
+            records,
             on_conflict='symbol,date,horizon,model_name,split'
         ).execute()
-        return 1
+        return len(records)
     except Exception as e:
-        print(f"   Error storing prediction: {e}")
+        print(f"   Error storing predictions: {e}")
         return None
 
 
@@ -201,20 +370,40 @@ def main():
     total_generated = 0
     horizons = ['1d', '5d']
     
-    for symbol in SYMBOLS:
-        print(f"Processing {symbol}...")
+    print("Fetching latest features...")
+    feature_names = get_feature_names(horizons, model_name='xgboost')
+    features_df = fetch_latest_features(db, SYMBOLS, feature_names)
+    if features_df is None:
+        print("     Failed to fetch features")
+        return
+    print()
+    
+    trading_days = get_trading_days(features_df)
+    targets = get_prediction_targets(features_df, trading_days)
+    if not targets:
+        print("     No prediction targets")
+        return
+    
+    existing = fetch_existing_predictions(
+        db,
+        [features_df.at[i, 'symbol'] for i in targets],
+        horizons,
+        sorted(set(targets.values())),
+        model_name='xgboost'
+    )
+    print()
+    
+    for horizon in horizons:
+        print(f"Processing {horizon} horizon...")
+        result = predict_horizon(db, features_df, targets, existing, horizon, model_name='xgboost')
         
-        for horizon in horizons:
-            print(f"   {horizon} horizon...")
-            result = predict_symbol(db, symbol, horizon, model_name='xgboost')
-            
-            if result == 1:
-                print(f"     Inserted 1 prediction")
-                total_generated += 1
-            elif result == 0:
-                print(f"     Prediction already exists")
-            else:
-                print(f"     Failed to generate prediction")
+        if result is None:
+            print(f"     Failed to generate predictions")
+        elif result > 0:
+            print(f"     Inserted {result} predictions")
+            total_generated += result
+        else:
+            print(f"     All predictions already exist")
         
         print()
     
@@ -0,0 +1,41 @@
+-- Migration: RPC returning the latest typed feature row per symbol
+-- Date: 2025-12-23
+--
+-- OBJECTIVE: Let inference fetch its inputs in one round-trip
+-- 1. DISTINCT ON (asset_id) picks the newest features_daily row per symbol
+-- 2. feature_json is expanded server-side into a float8 array, ordered
+--    like p_features, so the client gets a narrow typed payload
+-- 3. Non-numeric JSON values come back as NULL (NaN on the client)
+
+begin;
+
+create or replace function public.get_latest_features(
+  p_symbols text[],
+  p_features text[]
+)
+returns table(
+  symbol text,
+  date date,
+  features float8[]
+) as $$
+  select distinct on (a.id)
+    a.symbol,
+    f.date,
+    array(
+      select case
+        when jsonb_typeof(f.feature_json -> k.name) = 'number'
+          then (f.feature_json ->> k.name)::float8
+      end
+      from unnest(p_features) with ordinality as k(name, ord)
+      order by k.ord
+    ) as features
+  from public.assets a
+  join public.features_daily f on f.asset_id = a.id
+  where a.symbol = any(p_symbols)
+  order by a.id, f.date desc;
+$$ language sql stable;
+
+comment on function public.get_latest_features(text[], text[]) is
+  'Latest features_daily row per symbol with feature_json expanded to float8[] in p_features order';
+
+commit;
@@ -6,16 +6,46 @@ import pandas as pd
 from pathlib import Path
 
 
+# (source column, header, format) for each report table
+VAL_COLUMNS = [
+    ('model', 'Model', '{}'),
+    ('val_accuracy', 'Accuracy', '{:.4f}'),
+    ('val_f1_macro', 'F1 Macro', '{:.4f}'),
+    ('val_f1_action', 'F1 Action', '{:.4f}'),
+    ('val_trade_rate', 'Trade Rate', '{:.2%}'),
+    ('conf_thresh', 'Conf Thresh', '{:.2f}'),
+    ('margin_thresh', 'Margin Thresh', '{:.2f}'),
+]
+TEST_COLUMNS = [
+    ('model', 'Model', '{}'),
+    ('test_accuracy', 'Accuracy', '{:.4f}'),
+    ('test_f1_macro', 'F1 Macro', '{:.4f}'),
+    ('test_f1_action', 'F1 Action', '{:.4f}'),
+    ('test_trade_rate', 'Trade Rate', '{:.2%}'),
+]
+
+
+def format_table(df: pd.DataFrame, columns: list) -> str:
+    """Render selected columns as a markdown table, formatting each column at once."""
+    table = pd.DataFrame({
+        header: df[col].map(fmt.format) for col, header, fmt in columns
+    })
+    return table.to_markdown(index=False, disable_numparse=True)
+
+
 def generate_markdown_report():
-    """Generate markdown report from summary CSV."""
+    """Generate markdown report from summary Parquet (or CSV if Parquet is missing)."""
     summary_path = Path('ml/artifacts/reports/summary_by_horizon.csv')
+    parquet_path = summary_path.with_suffix('.parquet')
     
-    if not summary_path.exists():
+    if parquet_path.exists():
+        df = pd.read_parquet(parquet_path)
+    elif summary_path.exists():
+        df = pd.read_csv(summary_path)
+    else:
         print(f"Summary file not found: {summary_path}")
         return
     
-    df = pd.read_csv(summary_path)
-    
     # Generate markdown
     md = []
     md.append("# Multi-Horizon Classification Model Comparison\n")
@@ -33,23 +63,12 @@ def generate_markdown_report():
         
         # Validation metrics
         md.append("### Validation Metrics\n")
-        md.append("| Model | Accuracy | F1 Macro | F1 Action | Trade Rate | Conf Thresh | Margin Thresh |")
-        md.append("|-------|----------|----------|-----------|------------|-------------|---------------|")
-        
-        for _, row in horizon_df.iterrows():
-            md.append(f"| {row['model']} | {row['val_accuracy']:.4f} | {row['val_f1_macro']:.4f} | "
-                     f"{row['val_f1_action']:.4f} | {row['val_trade_rate']:.2%} | "
-                     f"{row['conf_thresh']:.2f} | {row['margin_thresh']:.2f} |")
+        md.append(format_table(horizon_df, VAL_COLUMNS))
         md.append("")
         
         # Test metrics
         md.append("### Test Metrics\n")
-        md.append("| Model | Accuracy | F1 Macro | F1 Action | Trade Rate |")
-        md.append("|-------|----------|----------|-----------|------------|")
-        
-        for _, row in horizon_df.iterrows():
-            md.append(f"| {row['model']} | {row['test_accuracy']:.4f} | {row['test_f1_macro']:.4f} | "
-                     f"{row['test_f1_action']:.4f} | {row['test_trade_rate']:.2%} |")
+        md.append(format_table(horizon_df, TEST_COLUMNS))
         md.append("")
     
     # Cross-horizon comparison
@@ -7,32 +7,31 @@ Supports both 1d and 5d horizons with separate calibration and thresholds.
 import os
 import sys
 import argparse
+import hashlib
 import logging
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import yaml
 import joblib
 import pandas as pd
 import numpy as np
+import xgboost as xgb
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 
-class XGBWrapper:
-    """Wrapper for XGBoost that handles label mapping for classification."""
-    def __init__(self, model, label_mapping):
-        self.model = model
-        self.label_mapping = label_mapping  # {0: -1, 1: 0, 2: 1}
-    
-    def predict(self, X):
-        # Predict with mapped labels (0,1,2) and convert back to (-1,0,1)
-        preds_mapped = self.model.predict(X)
-        return np.array([self.label_mapping[int(p)] for p in preds_mapped])
+class BoosterXGBModel:
+    """XGBoost Booster loaded from its native model.ubj (predict_proba only)."""
+    def __init__(self, ubj_path: str):
+        self.booster = xgb.Booster()
+        self.booster.load_model(ubj_path)
     
     def predict_proba(self, X):
-        return self.model.predict_proba(X)
+        p_up = self.booster.inplace_predict(np.asarray(X, dtype=np.float32))
+        return np.column_stack([1.0 - p_up, p_up])
 
 # Add paths
 ml_path = os.path.join(os.path.dirname(__file__), '..', '..')
@@ -44,6 +43,7 @@ from src.utils.io import load_from_csv, load_from_supabase
 from src.utils.splits import create_time_splits, prepare_X_y
 from src.utils.calibration import calibrate_probabilities, save_calibrator, load_calibrator, MulticlassCalibrator
 from src.utils.decision import compute_pred_features, apply_gating, tune_thresholds, evaluate_gating, save_thresholds, load_thresholds
+from src.utils.xgb_wrapper import XGBWrapper
 from etl.supabase_client import SupabaseDB
 
 logger = logging.getLogger(__name__)
@@ -64,15 +64,17 @@ def load_registry(registry_path: str) -> dict:
     return registry
 
 
-def get_raw_predictions(model, preprocessor, X: pd.DataFrame) -> np.ndarray:
+def get_raw_predictions(model, X_processed: np.ndarray) -> np.ndarray:
     """
     Get raw probabilities from model.
     
+    Args:
+        model: Trained model
+        X_processed: Features already transformed by the model's preprocessor
+    
     Returns:
         probs: (N, 2) array of [p_down, p_up]
     """
-    X_processed = preprocessor.transform(X, split_name='inference')
-    
     # Get probabilities
     probs = model.predict_proba(X_processed)
     
@@ -96,44 +98,83 @@ def create_prediction_dataframe(
     split: str
 ) -> pd.DataFrame:
     """Create dataframe with all prediction info."""
-    return pd.DataFrame({
-        'symbol': df['symbol'].values,
-        'date': df['date'].values,
-        'horizon': horizon,
-        'model_name': model_name,
-        'split': split,
-        'y_true': y,
-        'pred_class_raw': pred_class_raw,
-        'pred_class_final': pred_class_final,
-        'p_down': probs_cal[:, 0],
-        'p_up': probs_cal[:, 1],
-        'confidence': confidence,
-        'margin': margin
-    })
+    n = len(df)
+    
+    # Fill one 2-D block per dtype so pandas wraps them without consolidating
+    labels = np.empty((n, 3), dtype=np.result_type(y, pred_class_raw, pred_class_final))
+    labels[:, 0] = y
+    labels[:, 1] = pred_class_raw
+    labels[:, 2] = pred_class_final
+    
+    scores = np.empty((n, 4), dtype=np.result_type(probs_cal, confidence, margin))
+    scores[:, :2] = probs_cal
+    scores[:, 2] = confidence
+    scores[:, 3] = margin
+    
+    out = pd.DataFrame(scores, columns=['p_down', 'p_up', 'confidence', 'margin'], copy=False)
+    for i, col in enumerate(['y_true', 'pred_class_raw', 'pred_class_final']):
+        out.insert(i, col, labels[:, i])
+    out.insert(0, 'symbol', df['symbol'].values)
+    out.insert(1, 'date', df['date'].values)
+    out.insert(2, 'horizon', horizon)
+    out.insert(3, 'model_name', model_name)
+    out.insert(4, 'split', split)
+    return out
 
 
-def upsert_predictions_to_supabase(df: pd.DataFrame, db: SupabaseDB):
-    """Upsert predictions to Supabase."""
-    data = df.to_dict('records')
-    
-    # Convert dates to strings
-    for row in data:
-        row['date'] = str(row['date'].date()) if hasattr(row['date'], 'date') else str(row['date'])
-        # Convert numpy types to Python types
-        for key, val in row.items():
-            if isinstance(val, (np.integer, np.floating)):
-                row[key] = float(val) if 'p_' in key or key in ['confidence', 'margin'] else int(val)
-    
-    # Batch upsert
-    batch_size = 1000
-    for i in range(0, len(data), batch_size):
-        chunk = data[i:i+batch_size]
-        db.client.table('model_predictions_classification').upsert(
+def upsert_predictions_to_supabase(frames, db: SupabaseDB):
+    """
+    Upsert predictions to Supabase.
+    
+    Args:
+        frames: Prediction DataFrame, or an iterable of them (e.g. val then test);
+            each is converted and sent in turn without concatenating them
+        db: Supabase client
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    
+    def upsert_chunk(chunk):
+        return db.client.table('model_predictions_classification').upsert(
             chunk,
             on_conflict='symbol,date,horizon,model_name,split'
         ).execute()
     
-    logger.info(f"Upserted {len(data)} predictions to Supabase")
+    # Batch upsert; chunks hit distinct keys, so send them concurrently
+    batch_size = 1000
+    n_rows = 0
+    futures = []
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for df in frames:
+            # Fix dtypes up front; to_dict then hands out native Python int/float
+            df = df.astype({
+                'y_true': 'int64',
+                'pred_class_raw': 'int64',
+                'pred_class_final': 'int64',
+                'p_down': 'float64',
+                'p_up': 'float64',
+                'confidence': 'float64',
+                'margin': 'float64'
+            })
+            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+            data = df.to_dict('records')
+            
+            futures.extend(
+                executor.submit(upsert_chunk, data[i:i+batch_size])
+                for i in range(0, len(data), batch_size)
+            )
+            n_rows += len(data)
+        
+        for future in futures:
+            future.result()
+    
+    logger.info(f"Upserted {n_rows} predictions to Supabase")
+
+
+def file_digest(path: str) -> str:
+    """MD5 of a file's contents (identifies identical preprocessors across models)."""
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
 
 
 def process_horizon_model(
@@ -142,9 +183,15 @@ def process_horizon_model(
     registry: dict,
     splits: dict,
     args,
-    db: SupabaseDB = None
+    db: SupabaseDB = None,
+    transform_cache: dict = None
 ):
-    """Process predictions for a single horizon and model."""
+    """
+    Process predictions for a single horizon and model.
+    
+    transform_cache maps preprocessor digest -> (X_val_processed, X_test_processed)
+    so models sharing a preprocessor on the same horizon transform the splits once.
+    """
     logger.info("\n" + "=" * 70)
     logger.info(f"PROCESSING: {horizon.upper()} - {model_info['name']}")
     logger.info("=" * 70)
@@ -157,34 +204,59 @@ def process_horizon_model(
         logger.warning(f"Model not found: {model_path}. Skipping.")
         return
     
-    model = joblib.load(model_path)
-    preprocessor = joblib.load(preprocessor_path)
-    logger.info(f"Loaded model from {model_path}")
+    # Native XGBoost booster loads much faster than the pickled wrapper
+    ubj_path = Path(model_path).with_name('model.ubj')
+    if ubj_path.exists():
+        model = BoosterXGBModel(str(ubj_path))
+        logger.info(f"Loaded booster from {ubj_path}")
+    else:
+        model = joblib.load(model_path)
+        logger.info(f"Loaded model from {model_path}")
     
     # Prepare data
     target_col = registry['horizons'][horizon]['target_col']
     X_val, y_val = prepare_X_y(splits['val'], target_col=target_col)
     X_test, y_test = prepare_X_y(splits['test'], target_col=target_col)
     
+    # Preprocess (reused across models with an identical preprocessor)
+    if transform_cache is None:
+        transform_cache = {}
+    cache_key = file_digest(preprocessor_path)
+    if cache_key not in transform_cache:
+        preprocessor = joblib.load(preprocessor_path)
+        # float32 is what the tree predictors consume; cast once here
+        transform_cache[cache_key] = (
+            np.ascontiguousarray(preprocessor.transform(X_val, split_name='inference'), dtype=np.float32),
+            np.ascontiguousarray(preprocessor.transform(X_test, split_name='inference'), dtype=np.float32)
+        )
+    else:
+        logger.info("Reusing preprocessed val/test features")
+    X_val_processed, X_test_processed = transform_cache[cache_key]
+    
     # Get raw predictions
     logger.info("Computing raw predictions...")
-    probs_val_raw = get_raw_predictions(model, preprocessor, X_val)
-    probs_test_raw = get_raw_predictions(model, preprocessor, X_test)
+    probs_val_raw = get_raw_predictions(model, X_val_processed)
+    probs_test_raw = get_raw_predictions(model, X_test_processed)
     
     # Calibration
     calibrator_dir = Path(f"ml/artifacts/calibrators/{horizon}")
     calibrator_dir.mkdir(parents=True, exist_ok=True)
-    calibrator_path = calibrator_dir / f"{model_info['name']}_ovr.joblib"
+    calibrator_path = calibrator_dir / f"{model_info['name']}_ovr.npz"
+    # Calibrators saved before the .npz format are still picked up
+    existing_path = next(
+        (p for p in (calibrator_path, calibrator_path.with_suffix('.joblib')) if p.exists()),
+        None
+    )
     
-    if args.recalibrate or not calibrator_path.exists():
+    if args.recalibrate or existing_path is None:
         probs_val_cal, probs_test_cal, calibrator, cal_metrics = calibrate_probabilities(
             probs_val_raw, y_val.values,
             probs_test_raw, y_test.values
         )
         save_calibrator(calibrator, str(calibrator_path))
     else:
-        logger.info(f"Loading existing calibrator from {calibrator_path}")
-        calibrator = load_calibrator(str(calibrator_path))
+        logger.info(f"Loading existing calibrator from {existing_path}")
+        calibrator = load_calibrator(str(existing_path))
         probs_val_cal = calibrator.transform(probs_val_raw)
         probs_test_cal = calibrator.transform(probs_test_raw)
     
@@ -248,7 +320,7 @@ def process_horizon_model(
     
     # Store in Supabase if requested
     if args.store_db and db is not None:
-        upsert_predictions_to_supabase(pd.concat([df_val, df_test]), db)
+        upsert_predictions_to_supabase((df_val, df_test), db)
     
     return {
         'horizon': horizon,
@@ -334,9 +406,11 @@ def main():
             models_to_process = [m for m in models_to_process if m['name'] == args.model]
         
         # Process each model
+        transform_cache = {}
         for model_info in models_to_process:
             result = process_horizon_model(
-                horizon, model_info, registry, splits, args, db
+                horizon, model_info, registry, splits, args, db,
+                transform_cache=transform_cache
             )
             if result:
                 all_results.append(result)
@@ -365,7 +439,8 @@ def main():
         summary_path = Path('ml/artifacts/reports/summary_by_horizon.csv')
         summary_path.parent.mkdir(parents=True, exist_ok=True)
         summary_df.to_csv(summary_path, index=False)
-        logger.info(f"\nSaved summary to {summary_path}")
+        summary_df.to_parquet(summary_path.with_suffix('.parquet'), index=False)
+        logger.info(f"\nSaved summary to {summary_path} (+ .parquet)")
         
         # Print summary
         logger.info("\n" + "=" * 70)
@@ -1,14 +1,26 @@
 
 import os
 import sys
+import time
+import functools
 import pandas as pd
 import joblib
 import json
 import numpy as np
 import argparse
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 # Load env before other imports
 load_dotenv()
 
@@ -20,45 +32,58 @@ sys.path.insert(0, root_dir)
 sys.path.insert(0, os.path.join(root_dir, 'ml'))
 
 from etl.supabase_client import SupabaseDB
+from src.utils.xgb_wrapper import XGBWrapper
+
+# (fetched_at, {asset_id: symbol}); refreshed after ASSETS_TTL_SECONDS
+_assets_cache = (0.0, None)
+ASSETS_TTL_SECONDS = 600
+
+def get_assets_map(db: SupabaseDB) -> dict:
+    """Asset id -> symbol map, cached in-process for ASSETS_TTL_SECONDS."""
+    global _assets_cache
+    fetched_at, assets_map = _assets_cache
+    if assets_map is None or time.monotonic() - fetched_at > ASSETS_TTL_SECONDS:
+        assets = db.client.table("assets").select("id, symbol").execute()
+        assets_map = {row['id']: row['symbol'] for row in assets.data}
+        _assets_cache = (time.monotonic(), assets_map)
+    return assets_map
 
-def fetch_latest_features(db: SupabaseDB, lookback_days: int = 5) -> pd.DataFrame:
+def fetch_latest_features(db: SupabaseDB) -> pd.DataFrame:
     """
     Fetch the most recent feature rows from Supabase.
     Unlike the training views, this pulls RAW features_daily which includes today's data.
+    Only rows on the latest feature date are requested, one per symbol.
     """
-    print(f"Fetching features for last {lookback_days} days...")
-    
     # 1. Fetch Assets
-    assets = db.client.table("assets").select("id, symbol").execute()
-    assets_map = {row['id']: row['symbol'] for row in assets.data}
+    assets_map = get_assets_map(db)
     
     # 2. Fetch Features
-    # We can't do complex joins or filtering easily in one go with simple client, 
-    # so we'll fetch a range and filter in pandas.
-    latest_date = db.get_latest_date()
-    if not latest_date:
+    # Filter server-side to the latest features_daily date rather than
+    # pulling a lookback window and keeping the last row in pandas.
+    latest = db.client.table("features_daily")\
+        .select("date")\
+        .order("date", desc=True)\
+        .limit(1)\
+        .execute()
+    if not latest.data:
         print("No data found in DB.")
         return pd.DataFrame()
-        
-    start_date = (datetime.fromisoformat(latest_date) - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
-    
-    # Pagination loop just in case
-    all_rows = []
-    print(f"Querying from {start_date}...")
+    latest_date = latest.data[0]['date']
     
+    print(f"Fetching features for {latest_date}...")
     response = db.client.table("features_daily")\
         .select("asset_id, date, feature_json")\
-        .gte("date", start_date)\
+        .eq("date", latest_date)\
         .execute()
-        
-    all_rows.extend(response.data)
+    all_rows = response.data
     
     if not all_rows:
         return pd.DataFrame()
         
     # 3. Convert to DataFrame
     df = pd.DataFrame(all_rows)
-    df['symbol'] = df['asset_id'].map(assets_map)
+    # Few distinct symbols; categorical avoids per-row Python strings
+    df['symbol'] = df['asset_id'].map(assets_map).astype('category')
     df['date'] = pd.to_datetime(df['date'])
     
     # Unpack JSON features
@@ -68,55 +93,92 @@ def fetch_latest_features(db: SupabaseDB, lookback_days: int = 5) -> pd.DataFram
     # The client might have auto-parsed it if it was JSON type in postgres
     
     # Normalize feature_json
+    # orjson parses several times faster than the stdlib when available
+    loads = orjson.loads if orjson is not None else json.loads
+    
     def parse_json(x):
-        if isinstance(x, str):
-            return json.loads(x)
+        if isinstance(x, (str, bytes, bytearray)):
+            return loads(x)
         return x
 
     df['feature_json'] = df['feature_json'].apply(parse_json)
-    features_unpacked = df['feature_json'].apply(pd.Series)
+    # One DataFrame built from the list of dicts (not a Series per row);
+    # features are numeric, so cast in one go and coerce stray strings
+    features_unpacked = pd.DataFrame(df['feature_json'].tolist(), index=df.index)
+    try:
+        features_unpacked = features_unpacked.astype(np.float64)
+    except (TypeError, ValueError):
+        features_unpacked = features_unpacked.apply(pd.to_numeric, errors='coerce')
     
     # Combine
     full_df = pd.concat([df[['symbol', 'date']], features_unpacked], axis=1)
     
-    # Sort and Keep only the LATEST row per symbol
-    latest_df = full_df.sort_values('date').groupby('symbol').tail(1).reset_index(drop=True)
+    # Already one row per symbol on the latest date
+    latest_df = full_df.reset_index(drop=True)
     
     print(f"Found latest data for {len(latest_df)} symbols. Date: {latest_df['date'].max().date()}")
     return latest_df
 
+class OnnxModel:
+    """ONNX export of a trained classifier, run with onnxruntime."""
+    def __init__(self, onnx_path: str, classes: list):
+        self.session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.classes_ = np.asarray(classes)
+    
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        # Outputs: [label, probabilities]
+        return self.session.run(None, {self.input_name: X})[1]
+    
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+@functools.lru_cache(maxsize=8)
 def load_prediction_artifacts(model_name: str):
-    """Load model and preprocessor."""
+    """Load model and preprocessor (cached per process). Prefers model.onnx when present."""
     base_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'artifacts', 'models', model_name)
     
     model_path = os.path.join(base_dir, 'model.pkl')
     preproc_path = os.path.join(base_dir, 'preprocessor.pkl')
+    onnx_path = os.path.join(base_dir, 'model.onnx')
+    metadata_path = os.path.join(base_dir, 'metadata.json')
     
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model not found at {model_path}")
         
+    metadata = {}
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+    
+    # Newer runs save one preprocessor per horizon under models/_shared
+    if 'preprocessor_path' in metadata:
+        preproc_path = os.path.join(os.path.dirname(base_dir), metadata['preprocessor_path'])
+        
     print(f"Loading {model_name} from {base_dir}...")
-    model = joblib.load(model_path)
     preprocessor = joblib.load(preproc_path)
     
-    return model, preprocessor
-
-class XGBWrapper:
-    """Re-definition of wrapper since we can't easily import it without circular deps or path issues if not careful."""
-    def __init__(self, model, label_mapping):
-        self.model = model
-        self.label_mapping = label_mapping
+    # ONNX needs the class order from metadata (written by save_artifacts)
+    classes = metadata.get('classes')
+    if ort is not None and classes and os.path.exists(onnx_path):
+        try:
+            return OnnxModel(onnx_path, classes), preprocessor
+        except Exception as e:
+            print(f"  Could not load {onnx_path}: {e}")
     
-    def predict(self, X):
-        preds_mapped = self.model.predict(X)
-        return np.array([self.label_mapping[int(p)] for p in preds_mapped])
+    model = joblib.load(model_path)
     
-    def predict_proba(self, X):
-        return self.model.predict_proba(X)
+    return model, preprocessor
+
 
-# We need to make sure the customized class is available in main if pickle needs it,
-# but usually joblib saves the class definition ref. If it fails, we might need to import the exact class from training script.
-# For now, let's try loading.
+# Probabilities are stored to 4 decimals; rounding keeps the JSON payload short
+PROB_DECIMALS = 4
+
+def _chunked(records: list, n: int = 500):
+    """Yield successive n-sized slices of records."""
+    for i in range(0, len(records), n):
+        yield records[i:i + n]
 
 
 def upsert_predictions(db: SupabaseDB, results: pd.DataFrame):
@@ -130,40 +192,81 @@ def upsert_predictions(db: SupabaseDB, results: pd.DataFrame):
     # Schema: symbol, date, horizon, model_name, split, y_true, pred_class_raw, pred_class_final, 
     #         p_sell, p_hold, p_buy, confidence, margin, created_at
     
-    records = []
-    now_iso = datetime.now().isoformat()
-    
-    for _, row in results.iterrows():
-        record = {
-            "symbol": row['symbol'],
-            "date": row['date'].strftime('%Y-%m-%d'),
-            "horizon": row['horizon'],
-            "model_name": row['model_name'],
-            "split": "inference",
-            "y_true": None,
-            "pred_class_raw": int(row['prediction']),
-            "pred_class_final": int(row['prediction']), # Gating not applied here yet
-            "p_sell": float(row['p_sell']),
-            "p_hold": float(row['p_hold']),
-            "p_buy": float(row['p_buy']),
-            "confidence": float(max(row['p_sell'], row['p_hold'], row['p_buy'])),
-            "margin": float(abs(row['p_buy'] - row['p_sell'])), # Approximation
-            #"created_at": now_iso # specific to supabase auto-gen usually
-        }
-        records.append(record)
+    # Build every column at once; to_dict hands out native Python types
+    probs = results[['p_sell', 'p_hold', 'p_buy']].to_numpy(dtype=np.float64)
+    preds = results['prediction'].to_numpy().astype(np.int64)
+    records = pd.DataFrame({
+        "symbol": results['symbol'].to_numpy(),
+        "date": results['date'].dt.strftime('%Y-%m-%d').to_numpy(),
+        "horizon": results['horizon'].to_numpy(),
+        "model_name": results['model_name'].to_numpy(),
+        "split": "inference",
+        "y_true": None,
+        "pred_class_raw": preds,
+        "pred_class_final": preds, # Gating not applied here yet
+        "p_sell": probs[:, 0],
+        "p_hold": probs[:, 1],
+        "p_buy": probs[:, 2],
+        "confidence": probs.max(axis=1),
+        "margin": np.abs(probs[:, 2] - probs[:, 0]), # Approximation
+    }).round(PROB_DECIMALS).to_dict('records')
         
-    try:
-        # UPSERT
+    def upsert_batch(batch):
         # on_conflict needs to match the unique constraint of the table
         # usually (symbol, date, horizon, model_name, split)
-        db.client.table("model_predictions_classification").upsert(
-            records, 
+        return db.client.table("model_predictions_classification").upsert(
+            batch, 
             on_conflict="symbol,date,horizon,model_name,split"
         ).execute()
+    
+    try:
+        # UPSERT in batches, overlapping round-trips on the shared client
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(upsert_batch, _chunked(records, 500)))
         print("✅ Upsert successful.")
     except Exception as e:
         print(f"❌ Upsert failed: {e}")
 
+def run_horizon(horizon_name: str, suffix: str, df: pd.DataFrame, model_base: str):
+    """
+    Load, preprocess and predict one horizon.
+    Returns the formatted results DataFrame, or None if the horizon was skipped.
+    """
+    model_name = model_base + suffix
+    
+    try:
+        model, preprocessor = load_prediction_artifacts(model_name)
+    except Exception as e:
+        print(f"  Skipping {model_name}: {e}")
+        return None
+
+    # 3. Preprocess
+    try:
+        X_processed = preprocessor.transform(df, split_name='test')
+        X_processed = np.ascontiguousarray(X_processed, dtype=np.float32)
+    except Exception as e:
+        print(f"  Preprocessing failed for {model_name}: {e}")
+        return None
+
+    # 4. Predict (one pass; class = label of the most likely column)
+    probs = model.predict_proba(X_processed)
+    preds = model.classes_[probs.argmax(axis=1)]
+    
+    # 5. Format
+    res = df[['symbol', 'date']].copy()
+    res['horizon'] = horizon_name
+    res['model_name'] = model_base
+    res['prediction'] = preds
+    res['p_sell'] = probs[:, 0]
+    res['p_hold'] = probs[:, 1]
+    res['p_buy'] = probs[:, 2]
+    
+    # Recommendation String
+    labels = np.where(preds == 1, "BUY", np.where(preds == -1, "SELL", "HOLD"))
+    conf = probs.max(axis=1)
+    res['rec'] = [f"{label} ({c:.2f})" for label, c in zip(labels, conf)]
+    return res
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--model_base", type=str, default="xgboost", help="Base model name (xgboost, lightgbm, etc)")
@@ -179,53 +282,23 @@ def main():
 
     all_results = []
     
-    # 2. Loop Horizons
+    # 2. Run Horizons concurrently (model loading and tree inference release the GIL)
     horizons = [('1d', ''), ('5d', '_5d')]
     
     print("\n" + "="*60)
     print(f"GENERATING PREDICTIONS FOR {df['date'].max().date()}")
     print("="*60)
     
-    for horizon_name, suffix in horizons:
-        model_name = args.model_base + suffix
-        print(f"\nHorizon: {horizon_name.upper()} | Model: {model_name}")
-        
-        try:
-            model, preprocessor = load_prediction_artifacts(model_name)
-        except Exception as e:
-            print(f"  Skipping {model_name}: {e}")
-            continue
-
-        # 3. Preprocess
-        try:
-            X_processed = preprocessor.transform(df, split_name='test')
-        except Exception as e:
-            print(f"  Preprocessing failed: {e}")
+    with ThreadPoolExecutor(max_workers=len(horizons)) as executor:
+        results = list(executor.map(
+            lambda h: run_horizon(h[0], h[1], df, args.model_base), horizons
+        ))
+    
+    for (horizon_name, suffix), res in zip(horizons, results):
+        print(f"\nHorizon: {horizon_name.upper()} | Model: {args.model_base + suffix}")
+        if res is None:
+            print("  No predictions")
             continue
-
-        # 4. Predict
-        probs = model.predict_proba(X_processed)
-        preds = model.predict(X_processed)
-        
-        # 5. Format
-        res = df[['symbol', 'date']].copy()
-        res['horizon'] = horizon_name
-        res['model_name'] = args.model_base
-        res['prediction'] = preds
-        res['p_sell'] = probs[:, 0]
-        res['p_hold'] = probs[:, 1]
-        res['p_buy'] = probs[:, 2]
-        
-        # Recommendation String
-        def get_rec(row):
-            p = row['prediction']
-            conf = max(row['p_sell'], row['p_hold'], row['p_buy'])
-            label = "HOLD"
-            if p == 1: label = "BUY"
-            if p == -1: label = "SELL"
-            return f"{label} ({conf:.2f})"
-            
-        res['rec'] = res.apply(get_rec, axis=1)
         all_results.append(res)
         
         # Print Table
@@ -6,8 +6,10 @@ Identifies the most accurate model for each horizon and uploads only those predi
 
 import os
 import sys
+import time
 import pandas as pd
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -21,6 +23,42 @@ from etl.supabase_client import SupabaseDB
 
 logger = logging.getLogger(__name__)
 
+# Columns of model_predictions_classification; nothing else is read from parquet
+UPLOAD_COLS = [
+    'symbol', 'date', 'horizon', 'model_name', 'split', 'y_true',
+    'pred_class_raw', 'pred_class_final', 'p_down', 'p_up', 'confidence', 'margin'
+]
+
+UPLOAD_WORKERS = 4
+MAX_RETRIES = 5
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """True for rate-limit (429) and server-side (5xx) failures."""
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(exc, 'code', None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return status == 429 or 500 <= status < 600
+
+
+def _upsert_batch(db: SupabaseDB, batch: list):
+    """Upsert one batch, backing off exponentially on 429/5xx."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return db.client.table('model_predictions_classification').upsert(
+                batch,
+                on_conflict='symbol,date,horizon,model_name,split'
+            ).execute()
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1 or not _is_retryable(e):
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"Upload batch failed ({e}); retrying in {delay}s")
+            time.sleep(delay)
+
 
 def setup_logging():
     """Configure logging."""
@@ -72,7 +110,7 @@ def load_test_predictions(horizon: str, model: str, reports_dir: str) -> pd.Data
     if not test_path.exists():
         raise FileNotFoundError(f"Test predictions not found: {test_path}")
     
-    df = pd.read_parquet(test_path)
+    df = pd.read_parquet(test_path, columns=UPLOAD_COLS, engine='pyarrow', use_threads=True)
     logger.info(f"Loaded {len(df)} test predictions for {horizon}/{model}")
     
     return df
@@ -87,31 +125,26 @@ def upload_to_supabase(df: pd.DataFrame, db: SupabaseDB, batch_size: int = 1000)
         db: SupabaseDB instance
         batch_size: Number of rows per batch
     """
-    # Prepare data for upload
+    # Prepare data for upload; format dates in one vectorized pass
+    df = df.copy(deep=False)
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
     records = df.to_dict('records')
     
-    # Convert date to string format
-    for record in records:
-        if pd.notna(record['date']):
-            record['date'] = pd.to_datetime(record['date']).strftime('%Y-%m-%d')
-    
     logger.info(f"Uploading {len(records)} records to Supabase...")
     
-    # Upload in batches
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
-        
-        try:
-            response = db.client.table('model_predictions_classification').upsert(
-                batch,
-                on_conflict='symbol,date,horizon,model_name,split'
-            ).execute()
-            
-            logger.info(f"Uploaded batch {i//batch_size + 1}/{(len(records)-1)//batch_size + 1}")
-            
-        except Exception as e:
-            logger.error(f"Error uploading batch {i//batch_size + 1}: {e}")
-            raise
+    # Upload batches concurrently; wall time tracks the slowest batch, not the sum
+    batches = [records[i:i+batch_size] for i in range(0, len(records), batch_size)]
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = {executor.submit(_upsert_batch, db, batch): n
+                   for n, batch in enumerate(batches, 1)}
+        for future in as_completed(futures):
+            n = futures[future]
+            try:
+                future.result()
+                logger.info(f"Uploaded batch {n}/{len(batches)}")
+            except Exception as e:
+                logger.error(f"Error uploading batch {n}: {e}")
+                raise
     
     logger.info(f"Successfully uploaded {len(records)} records")
 
@@ -171,6 +204,8 @@ def main():
     # Combine all predictions
     if all_predictions:
         combined_df = pd.concat(all_predictions, ignore_index=True)
+        # Low-cardinality labels; to_dict still yields plain str for the upload
+        combined_df = combined_df.astype({'symbol': 'category', 'horizon': 'category'})
         logger.info(f"\n{'='*70}")
         logger.info(f"UPLOADING COMBINED PREDICTIONS")
         logger.info(f"{'='*70}")
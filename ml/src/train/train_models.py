@@ -11,6 +11,10 @@ from datetime import datetime
 import yaml
 import joblib
 import json
+import functools
+import shutil
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import numpy as np
@@ -22,26 +26,37 @@ from src.utils.io import load_from_csv, load_from_supabase
 from src.utils.splits import create_time_splits, prepare_X_y
 from src.utils.preprocess import TimeSeriesPreprocessor, compute_class_weights
 from src.utils.metrics import evaluate_model, compare_models
+from src.utils.xgb_wrapper import XGBWrapper
 
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier
 import lightgbm as lgb
 import xgboost as xgb
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-class XGBWrapper:
-    """Wrapper for XGBoost that handles label mapping for classification."""
-    def __init__(self, model, label_mapping):
-        self.model = model
-        self.label_mapping = label_mapping  # {0: -1, 1: 0, 2: 1}
-    
-    def predict(self, X):
-        # Predict with mapped labels (0,1,2) and convert back to (-1,0,1)
-        preds_mapped = self.model.predict(X)
-        return np.array([self.label_mapping[int(p)] for p in preds_mapped])
-    
-    def predict_proba(self, X):
-        return self.model.predict_proba(X)
+try:
+    import treelite
+    import tl2cgen
+except ImportError:
+    treelite = None
+    tl2cgen = None
+
+try:
+    from onnxmltools.convert import convert_xgboost, convert_lightgbm
+    from onnxmltools.convert.common.data_types import FloatTensorType
+except ImportError:
+    convert_xgboost = None
+    convert_lightgbm = None
+
+try:
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType as SklFloatTensorType
+except ImportError:
+    convert_sklearn = None
 
 
 def setup_logging():
@@ -70,7 +85,7 @@ def load_config(config_path: str) -> dict:
     return config
 
 
-def train_logistic_regression(X_train, y_train, class_weights, config):
+def train_logistic_regression(X_train, y_train, class_weights, config, n_jobs=-1):
     """Train Logistic Regression model."""
     logger = logging.getLogger(__name__)
     logger.info("\n" + "=" * 70)
@@ -83,7 +98,7 @@ def train_logistic_regression(X_train, y_train, class_weights, config):
         max_iter=params.get('max_iter', 1000),
         class_weight=params.get('class_weight', 'balanced'),
         random_state=params.get('random_state', 42),
-        n_jobs=-1
+        n_jobs=n_jobs
     )
     
     model.fit(X_train, y_train)
@@ -92,7 +107,7 @@ def train_logistic_regression(X_train, y_train, class_weights, config):
     return model
 
 
-def train_random_forest(X_train, y_train, class_weights, config):
+def train_random_forest(X_train, y_train, class_weights, config, n_jobs=-1):
     """Train Random Forest model."""
     logger = logging.getLogger(__name__)
     logger.info("\n" + "=" * 70)
@@ -107,7 +122,7 @@ def train_random_forest(X_train, y_train, class_weights, config):
         min_samples_split=params.get('min_samples_split', 50),
         class_weight=params.get('class_weight', 'balanced'),
         random_state=params.get('random_state', 42),
-        n_jobs=-1
+        n_jobs=n_jobs
     )
     
     model.fit(X_train, y_train)
@@ -116,8 +131,8 @@ def train_random_forest(X_train, y_train, class_weights, config):
     return model
 
 
-def train_lightgbm(X_train, y_train, class_weights, config):
-    """Train LightGBM model."""
+def train_lightgbm(X_train, y_train, class_weights, config, n_jobs=-1, eval_set=None):
+    """Train LightGBM model (early-stopped on eval_set=(X_val, y_val) if given)."""
     logger = logging.getLogger(__name__)
     logger.info("\n" + "=" * 70)
     logger.info("TRAINING: LIGHTGBM")
@@ -133,17 +148,46 @@ def train_lightgbm(X_train, y_train, class_weights, config):
         class_weight='balanced',
         random_state=params.get('random_state', 42),
         verbosity=-1,
-        n_jobs=-1
+        n_jobs=n_jobs
     )
     
-    model.fit(X_train, y_train)
+    if eval_set is not None:
+        model.fit(
+            X_train, y_train,
+            eval_set=[eval_set],
+            callbacks=[
+                lgb.early_stopping(params.get('early_stopping_rounds', 50), verbose=False),
+                lgb.log_evaluation(0)
+            ]
+        )
+        logger.info(f"LightGBM stopped at iteration {model.best_iteration_}")
+    else:
+        model.fit(X_train, y_train)
     logger.info("LightGBM trained successfully")
     
     return model
 
 
-def train_xgboost(X_train, y_train, class_weights, config):
-    """Train XGBoost model for BINARY classification."""
+@functools.lru_cache(maxsize=1)
+def xgb_device() -> str:
+    """'cuda' if this XGBoost build can train on a visible GPU, else 'cpu'."""
+    if not xgb.build_info().get('USE_CUDA', False):
+        return 'cpu'
+    # CUDA builds silently fall back to CPU when no GPU is visible, so train
+    # a one-round probe and read back the device XGBoost actually used
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            probe = xgb.DMatrix(np.zeros((2, 1)), label=[0, 1])
+            booster = xgb.train({'device': 'cuda', 'tree_method': 'hist'}, probe, num_boost_round=1)
+        device = json.loads(booster.save_config())['learner']['generic_param']['device']
+    except xgb.core.XGBoostError:
+        return 'cpu'
+    return 'cuda' if device.startswith('cuda') else 'cpu'
+
+
+def train_xgboost(X_train, y_train, class_weights, config, n_jobs=-1, eval_set=None):
+    """Train XGBoost model for BINARY classification (early-stopped on eval_set if given)."""
     logger = logging.getLogger(__name__)
     logger.info("\n" + "=" * 70)
     logger.info("TRAINING: XGBOOST (BINARY)")
@@ -159,16 +203,34 @@ def train_xgboost(X_train, y_train, class_weights, config):
     class_weights_mapped = {0: class_weights[-1], 1: class_weights[1]}
     sample_weights = np.array([class_weights_mapped[y] for y in y_train_mapped])
     
+    device = params.get('device') or xgb_device()
+    logger.info(f"XGBoost device: {device}")
+    
     model = xgb.XGBClassifier(
         n_estimators=params.get('n_estimators', 200),
         learning_rate=params.get('learning_rate', 0.05),
         max_depth=params.get('max_depth', 6),
         random_state=params.get('random_state', 42),
-        n_jobs=-1,
-        tree_method='hist'
+        n_jobs=n_jobs,
+        tree_method='hist',
+        device=device,
+        max_bin=params.get('max_bin', 256),
+        early_stopping_rounds=params.get('early_stopping_rounds', 50) if eval_set is not None else None
     )
     
-    model.fit(X_train, y_train_mapped, sample_weight=sample_weights)
+    if eval_set is not None:
+        X_val, y_val = eval_set
+        model.fit(
+            X_train, y_train_mapped,
+            sample_weight=sample_weights,
+            eval_set=[(X_val, y_val.map({-1: 0, 1: 1}))],
+            verbose=False
+        )
+        logger.info(f"XGBoost stopped at iteration {model.best_iteration}")
+    else:
+        model.fit(X_train, y_train_mapped, sample_weight=sample_weights)
+    # Saved models should predict on CPU-only hosts too
+    model.set_params(device='cpu')
     logger.info("XGBoost trained successfully")
     
     # Wrap model to handle label mapping
@@ -176,8 +238,50 @@ def train_xgboost(X_train, y_train, class_weights, config):
     return XGBWrapper(model, label_mapping)
 
 
-def save_artifacts(model, preprocessor, model_name, config, metrics, feature_names):
-    """Save trained model and metadata."""
+def best_booster(xgb_model):
+    """Booster truncated to the early-stopping best iteration (all trees otherwise)."""
+    booster = xgb_model.get_booster()
+    best = getattr(xgb_model, 'best_iteration', None)
+    return booster[:best + 1] if best is not None else booster
+
+
+def convert_to_onnx(model, n_features):
+    """
+    ONNX graph for a trained model, or None if its converter isn't installed.
+    Probabilities are emitted as a plain (N, n_classes) tensor (no ZipMap).
+    """
+    if isinstance(model, XGBWrapper):
+        if convert_xgboost is None:
+            return None
+        initial_types = [('input', FloatTensorType([None, n_features]))]
+        return convert_xgboost(model.model, initial_types=initial_types)
+    if isinstance(model, lgb.LGBMClassifier):
+        if convert_lightgbm is None:
+            return None
+        initial_types = [('input', FloatTensorType([None, n_features]))]
+        return convert_lightgbm(model, initial_types=initial_types, zipmap=False)
+    if convert_sklearn is None:
+        return None
+    initial_types = [('input', SklFloatTensorType([None, n_features]))]
+    return convert_sklearn(model, initial_types=initial_types, options={id(model): {'zipmap': False}})
+
+
+def save_shared_preprocessor(preprocessor, suffix=''):
+    """Save the fitted preprocessor once per training run; returns its path."""
+    logger = logging.getLogger(__name__)
+    
+    artifacts_base = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'artifacts')
+    shared_dir = os.path.join(artifacts_base, 'models', '_shared')
+    os.makedirs(shared_dir, exist_ok=True)
+    
+    preprocessor_path = os.path.join(shared_dir, f'preprocessor{suffix}.pkl')
+    joblib.dump(preprocessor, preprocessor_path)
+    logger.info(f"Saved preprocessor to {preprocessor_path}")
+    return preprocessor_path
+
+
+def save_artifacts(model, preprocessor_path, model_name, config, metrics, feature_names):
+    """Save trained model and metadata (preprocessor_path from save_shared_preprocessor)."""
     logger = logging.getLogger(__name__)
     
     # Create artifacts directory (relative to script location)
@@ -187,27 +291,69 @@ def save_artifacts(model, preprocessor, model_name, config, metrics, feature_nam
     
     # Save model
     model_path = os.path.join(model_dir, 'model.pkl')
-    joblib.dump(model, model_path)
+    joblib.dump(model, model_path, compress=3)
     logger.info(f"Saved model to {model_path}")
     
-    # Save preprocessor
-    preprocessor_path = os.path.join(model_dir, 'preprocessor.pkl')
-    joblib.dump(preprocessor, preprocessor_path)
-    logger.info(f"Saved preprocessor to {preprocessor_path}")
+    # Save native XGBoost booster (loads without unpickling the sklearn wrapper)
+    if isinstance(model, XGBWrapper):
+        ubj_path = os.path.join(model_dir, 'model.ubj')
+        best_booster(model.model).save_model(ubj_path)
+        logger.info(f"Saved booster to {ubj_path}")
+    
+    # Compile XGBoost trees to a shared library for fast single-row inference
+    if isinstance(model, XGBWrapper) and tl2cgen is not None:
+        lib_path = os.path.join(model_dir, 'model.so')
+        try:
+            tl_model = treelite.frontend.from_xgboost(best_booster(model.model))
+            tl2cgen.export_lib(tl_model, toolchain='gcc', libpath=lib_path, params={'parallel_comp': 8})
+            logger.info(f"Saved compiled model to {lib_path}")
+        except Exception as e:
+            logger.warning(f"Treelite compilation failed, skipping model.so: {e}")
+    
+    # Export to ONNX for onnxruntime inference
+    onnx_path = os.path.join(model_dir, 'model.onnx')
+    try:
+        onx = convert_to_onnx(model, len(feature_names))
+        if onx is not None:
+            with open(onnx_path, 'wb') as f:
+                f.write(onx.SerializeToString())
+            logger.info(f"Saved ONNX model to {onnx_path}")
+    except Exception as e:
+        logger.warning(f"ONNX conversion failed, skipping model.onnx: {e}")
+    
+    # Link the shared preprocessor for loaders that expect it per model
+    # (copy where symlinks are unavailable)
+    link_path = os.path.join(model_dir, 'preprocessor.pkl')
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    try:
+        os.symlink(os.path.relpath(preprocessor_path, model_dir), link_path)
+    except OSError:
+        shutil.copyfile(preprocessor_path, link_path)
     
     # Save metadata
     metadata = {
         'model_name': model_name,
         'timestamp': datetime.now().isoformat(),
         'config': config,
-        'metrics': {k: float(v) for k, v in metrics.items()},
+        'metrics': metrics,
         'n_features': len(feature_names),
+        'classes': [int(c) for c in model.classes_],  # predict_proba column order
+        'preprocessor_path': os.path.relpath(preprocessor_path, os.path.dirname(model_dir)),
         'feature_names': feature_names
     }
     
     metadata_path = os.path.join(model_dir, 'metadata.json')
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    if orjson is not None:
+        # Serializes numpy scalars natively; config has int keys (class_mapping)
+        with open(metadata_path, 'wb') as f:
+            f.write(orjson.dumps(
+                metadata,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            ))
+    else:
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2, default=float)
     logger.info(f"Saved metadata to {metadata_path}")
 
 
@@ -278,16 +424,28 @@ def main():
     preprocessor = TimeSeriesPreprocessor(
         drop_features_threshold=config['preprocessing']['missing_threshold'],
         imputation_strategy=config['preprocessing']['imputation_strategy'],
-        scaling=config['preprocessing']['scale_features']
+        scaling=config['preprocessing']['scale_features'],
+        # Only logistic regression needs scaled inputs; same test as the trainer filter below
+        model_family='linear' if 'logistic_regression' in config['models'] else 'tree'
     )
     
-    X_train_processed = preprocessor.fit_transform(X_train)
+    X_train_processed = preprocessor.fit_transform(
+        X_train, chunk_rows=config['preprocessing'].get('fit_chunk_rows')
+    )
     X_val_processed = preprocessor.transform(X_val, split_name='val')
     X_test_processed = preprocessor.transform(X_test, split_name='test')
     
+    # Tree learners work in float32; convert once instead of per fit/predict
+    X_train_processed = np.ascontiguousarray(X_train_processed, dtype=np.float32)
+    X_val_processed = np.ascontiguousarray(X_val_processed, dtype=np.float32)
+    X_test_processed = np.ascontiguousarray(X_test_processed, dtype=np.float32)
+    
     feature_names = preprocessor.get_feature_names()
     logger.info(f"\nFinal feature count: {len(feature_names)}")
     
+    # Written once; each model's artifacts reference it
+    preprocessor_path = save_shared_preprocessor(preprocessor, args.suffix)
+    
     # Compute class weights
     class_weights = compute_class_weights(y_train)
     
@@ -301,118 +459,43 @@ def main():
     figures_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'artifacts', 'figures')
     os.makedirs(figures_dir, exist_ok=True)
     
-    # Logistic Regression
-    if 'logistic_regression' in config['models']:
-        model_name = 'logistic_regression' + args.suffix
-        model = train_logistic_regression(X_train_processed, y_train, class_weights, config)
-        models[model_name] = model
-        
-        train_metrics = evaluate_model(
-            model, X_train_processed, y_train, 'train',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        val_metrics = evaluate_model(
-            model, X_val_processed, y_val, 'val',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        test_metrics = evaluate_model(
-            model, X_test_processed, y_test, 'test',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        
-        # Store results
-        all_results[model_name] = {
-            'train_accuracy': train_metrics['accuracy'],
-            'train_f1_macro': train_metrics['f1_macro'],
-            'val_accuracy': val_metrics['accuracy'],
-            'val_f1_macro': val_metrics['f1_macro'],
-            'test_accuracy': test_metrics['accuracy'],
-            'test_f1_macro': test_metrics['f1_macro']
-        }
-        
-        # Save artifacts
-        save_artifacts(model, preprocessor, model_name, config, val_metrics, feature_names)
-    
-    # Random Forest
-    if 'random_forest' in config['models']:
-        model_name = 'random_forest' + args.suffix
-        model = train_random_forest(X_train_processed, y_train, class_weights, config)
-        models[model_name] = model
-        
-        train_metrics = evaluate_model(
-            model, X_train_processed, y_train, 'train',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        val_metrics = evaluate_model(
-            model, X_val_processed, y_val, 'val',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        test_metrics = evaluate_model(
-            model, X_test_processed, y_test, 'test',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        
-        all_results[model_name] = {
-            'train_accuracy': train_metrics['accuracy'],
-            'train_f1_macro': train_metrics['f1_macro'],
-            'val_accuracy': val_metrics['accuracy'],
-            'val_f1_macro': val_metrics['f1_macro'],
-            'test_accuracy': test_metrics['accuracy'],
-            'test_f1_macro': test_metrics['f1_macro']
-        }
-        
-        save_artifacts(model, preprocessor, model_name, config, val_metrics, feature_names)
+    # Train models; they are independent, so run two at a time with half
+    # the cores each instead of leaving cores idle between fits
+    # Boosted models early-stop on the validation split
+    early_stop = {'eval_set': (X_val_processed, y_val)}
+    trainers = [
+        ('logistic_regression', train_logistic_regression, {}),
+        ('random_forest', train_random_forest, {}),
+        ('lightgbm', train_lightgbm, early_stop),
+        ('xgboost', train_xgboost, early_stop),
+    ]
+    trainers = [t for t in trainers if t[0] in config['models']]
+    n_jobs = max(1, (os.cpu_count() or 2) // 2)
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(fn, X_train_processed, y_train, class_weights, config, n_jobs, **kwargs)
+            for _, fn, kwargs in trainers
+        ]
+        trained = [(t[0], future.result()) for t, future in zip(trainers, futures)]
     
-    # LightGBM
-    if 'lightgbm' in config['models']:
-        model_name = 'lightgbm' + args.suffix
-        model = train_lightgbm(X_train_processed, y_train, class_weights, config)
-        models[model_name] = model
-        
-        train_metrics = evaluate_model(
-            model, X_train_processed, y_train, 'train',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        val_metrics = evaluate_model(
-            model, X_val_processed, y_val, 'val',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        test_metrics = evaluate_model(
-            model, X_test_processed, y_test, 'test',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
-        
-        all_results[model_name] = {
-            'train_accuracy': train_metrics['accuracy'],
-            'train_f1_macro': train_metrics['f1_macro'],
-            'val_accuracy': val_metrics['accuracy'],
-            'val_f1_macro': val_metrics['f1_macro'],
-            'test_accuracy': test_metrics['accuracy'],
-            'test_f1_macro': test_metrics['f1_macro']
-        }
-        
-        save_artifacts(model, preprocessor, model_name, config, val_metrics, feature_names)
+    # Train metrics are only logged, so score a fixed random subsample
+    train_subsample = config.get('eval', {}).get('train_subsample', 0.1)
+    n_sub = int(train_subsample * len(X_train_processed))
+    sub_idx = np.random.RandomState(0).choice(len(X_train_processed), size=n_sub, replace=False)
     
-    # XGBoost
-    if 'xgboost' in config['models']:
-        model_name = 'xgboost' + args.suffix
-        model = train_xgboost(X_train_processed, y_train, class_weights, config)
+    # Evaluate and save sequentially (deterministic order; plotting is not thread-safe)
+    for base_name, model in trained:
+        model_name = base_name + args.suffix
         models[model_name] = model
         
-        train_metrics = evaluate_model(
-            model, X_train_processed, y_train, 'train',
-            target_names=target_names,
-            save_dir=figures_dir
-        )
+        train_metrics = None
+        if n_sub > 0:
+            train_metrics = evaluate_model(
+                model, X_train_processed[sub_idx], y_train.iloc[sub_idx], 'train_sub',
+                target_names=target_names,
+                save_dir=figures_dir
+            )
         val_metrics = evaluate_model(
             model, X_val_processed, y_val, 'val',
             target_names=target_names,
@@ -424,16 +507,21 @@ def main():
             save_dir=figures_dir
         )
         
-        all_results[model_name] = {
-            'train_accuracy': train_metrics['accuracy'],
-            'train_f1_macro': train_metrics['f1_macro'],
+        # Store results
+        results = {}
+        if train_metrics is not None:
+            results['train_accuracy'] = train_metrics['accuracy']
+            results['train_f1_macro'] = train_metrics['f1_macro']
+        results.update({
             'val_accuracy': val_metrics['accuracy'],
             'val_f1_macro': val_metrics['f1_macro'],
             'test_accuracy': test_metrics['accuracy'],
             'test_f1_macro': test_metrics['f1_macro']
-        }
+        })
+        all_results[model_name] = results
         
-        save_artifacts(model, preprocessor, model_name, config, val_metrics, feature_names)
+        # Save artifacts
+        save_artifacts(model, preprocessor_path, model_name, config, val_metrics, feature_names)
     
     # Compare models
     logger.info("\n" + "=" * 70)
@@ -10,7 +10,6 @@ import pandas as pd
 from typing import Dict, Tuple
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.isotonic import IsotonicRegression
-from sklearn.metrics import brier_score_loss
 import joblib
 import logging
 
@@ -39,16 +38,20 @@ class MulticlassCalibrator:
         self.classes = sorted(np.unique(y_true))
         logger.info(f"Fitting OvR calibrators for classes {self.classes}...")
         
-        for i, cls in enumerate(self.classes):
+        def _fit_one(i, cls):
             # Binary target: 1 if y==cls, else 0
-            y_binary = (y_true == cls).astype(int)
-            p_class = probs[:, i]
-            
-            # Fit isotonic regression
+            y_binary = (y_true == cls).astype(np.int8)
             cal = IsotonicRegression(out_of_bounds='clip')
-            cal.fit(p_class, y_binary)
-            self.calibrators[cls] = cal
-            
+            cal.fit(probs[:, i], y_binary)
+            return cls, cal
+        
+        # Classes are independent; threads suffice as sklearn's PAVA releases the GIL
+        results = joblib.Parallel(n_jobs=len(self.classes), prefer='threads')(
+            joblib.delayed(_fit_one)(i, cls) for i, cls in enumerate(self.classes)
+        )
+        self.calibrators = dict(results)
+        
+        for cls in self.classes:
             logger.info(f"  Calibrator for class {cls}: fitted")
         
         return self
@@ -63,18 +66,22 @@ class MulticlassCalibrator:
         Returns:
             calibrated_probs: (N, K) array, renormalized to sum to 1
         """
+        probs = np.asarray(probs, dtype=np.float32)
         N = probs.shape[0]
         K = len(self.classes)
-        calibrated = np.zeros((N, K))
+        calibrated = np.empty((N, K), dtype=np.float32)
         
-        for i, cls in enumerate(self.classes):
-            p_class = probs[:, i]
-            calibrated[:, i] = self.calibrators[cls].predict(p_class)
+        def _predict_one(i, cls):
+            calibrated[:, i] = self.calibrators[cls].predict(probs[:, i])
         
-        # Renormalize to sum to 1
-        row_sums = calibrated.sum(axis=1, keepdims=True)
-        row_sums = np.maximum(row_sums, 1e-9)  # Avoid division by zero
-        calibrated = calibrated / row_sums
+        joblib.Parallel(n_jobs=K, prefer='threads')(
+            joblib.delayed(_predict_one)(i, cls) for i, cls in enumerate(self.classes)
+        )
+        
+        # Renormalize to sum to 1, in place
+        row_sums = calibrated.sum(axis=1)
+        np.maximum(row_sums, 1e-9, out=row_sums)  # Avoid division by zero
+        np.divide(calibrated, row_sums[:, None], out=calibrated)
         
         return calibrated
     
@@ -84,6 +91,26 @@ class MulticlassCalibrator:
         return self.transform(probs)
 
 
+def one_hot(y_true: np.ndarray, classes) -> np.ndarray:
+    """(N, K) int8 indicator matrix of y_true against classes."""
+    return (np.asarray(y_true)[:, None] == np.asarray(classes)[None, :]).astype(np.int8)
+
+
+def brier_per_class(probs: np.ndarray, onehot: np.ndarray) -> np.ndarray:
+    """
+    One-vs-rest Brier score for every class in a single pass.
+    
+    Args:
+        probs: (N, K) array of class probabilities
+        onehot: (N, K) indicator matrix from one_hot, same column order
+        
+    Returns:
+        (K,) array of Brier scores
+    """
+    # float32 inputs are fine; accumulate the mean in float64
+    return ((probs - onehot) ** 2).mean(axis=0, dtype=np.float64)
+
+
 def calibrate_probabilities(
     probs_val: np.ndarray,
     y_val: np.ndarray,
@@ -109,6 +136,10 @@ def calibrate_probabilities(
     logger.info("PROBABILITY CALIBRATION (One-vs-Rest)")
     logger.info("=" * 70)
     
+    # float32 keeps all meaningful precision and halves memory traffic
+    probs_val = np.asarray(probs_val, dtype=np.float32)
+    probs_test = np.asarray(probs_test, dtype=np.float32)
+    
     # Fit calibrator on VAL only
     calibrator = MulticlassCalibrator()
     probs_val_cal = calibrator.fit_transform(probs_val, y_val)
@@ -120,27 +151,25 @@ def calibrate_probabilities(
     metrics = {}
     class_names = {-1: 'down', 1: 'up', 0: 'hold'}  # Support both binary and 3-class
     
+    # Targets built once per split, shared by the before/after scores
+    Y_val = one_hot(y_val, calibrator.classes)
+    Y_test = one_hot(y_test, calibrator.classes)
+    
+    brier_val_before = brier_per_class(probs_val, Y_val)
+    brier_test_before = brier_per_class(probs_test, Y_test)
+    brier_val_after = brier_per_class(probs_val_cal, Y_val)
+    brier_test_after = brier_per_class(probs_test_cal, Y_test)
+    
     for i, cls in enumerate(calibrator.classes):
         name = class_names.get(cls, f'class_{cls}')
-        y_val_binary = (y_val == cls).astype(int)
-        y_test_binary = (y_test == cls).astype(int)
-        
-        # Before calibration
-        brier_val_before = brier_score_loss(y_val_binary, probs_val[:, i])
-        brier_test_before = brier_score_loss(y_test_binary, probs_test[:, i])
-        
-        # After calibration
-        brier_val_after = brier_score_loss(y_val_binary, probs_val_cal[:, i])
-        brier_test_after = brier_score_loss(y_test_binary, probs_test_cal[:, i])
-        
-        metrics[f'brier_{name}_val_before'] = brier_val_before
-        metrics[f'brier_{name}_val_after'] = brier_val_after
-        metrics[f'brier_{name}_test_before'] = brier_test_before
-        metrics[f'brier_{name}_test_after'] = brier_test_after
+        metrics[f'brier_{name}_val_before'] = brier_val_before[i]
+        metrics[f'brier_{name}_val_after'] = brier_val_after[i]
+        metrics[f'brier_{name}_test_before'] = brier_test_before[i]
+        metrics[f'brier_{name}_test_after'] = brier_test_after[i]
         
         logger.info(f"\nClass {cls} ({name}):")
-        logger.info(f"  VAL Brier:  {brier_val_before:.4f} → {brier_val_after:.4f}")
-        logger.info(f"  TEST Brier: {brier_test_before:.4f} → {brier_test_after:.4f}")
+        logger.info(f"  VAL Brier:  {brier_val_before[i]:.4f} → {brier_val_after[i]:.4f}")
+        logger.info(f"  TEST Brier: {brier_test_before[i]:.4f} → {brier_test_after[i]:.4f}")
     
     logger.info("=" * 70)
     
@@ -148,13 +177,43 @@ def calibrate_probabilities(
 
 
 def save_calibrator(calibrator: MulticlassCalibrator, path: str):
-    """Save calibrator to disk."""
-    joblib.dump(calibrator, path)
+    """
+    Save calibrator to disk as a compressed .npz.
+    
+    Each isotonic calibrator is fully described by its threshold arrays,
+    so those are stored directly instead of pickling sklearn objects.
+    """
+    arrays = {'classes': np.asarray(calibrator.classes)}
+    for cls in calibrator.classes:
+        cal = calibrator.calibrators[cls]
+        arrays[f'x_{cls}'] = cal.X_thresholds_
+        arrays[f'y_{cls}'] = cal.y_thresholds_
+        arrays[f'increasing_{cls}'] = cal.increasing_
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
     logger.info(f"Saved calibrator to {path}")
 
 
 def load_calibrator(path: str) -> MulticlassCalibrator:
-    """Load calibrator from disk."""
-    calibrator = joblib.load(path)
+    """Load calibrator from disk (.npz, or a legacy joblib pickle)."""
+    if str(path).endswith('.joblib'):
+        calibrator = joblib.load(path)
+        logger.info(f"Loaded calibrator from {path}")
+        return calibrator
+    
+    calibrator = MulticlassCalibrator()
+    with np.load(path) as z:
+        calibrator.classes = z['classes'].tolist()
+        for cls in calibrator.classes:
+            x, y = z[f'x_{cls}'], z[f'y_{cls}']
+            # Files saved before the direction was stored come from the
+            # default increasing=True fit
+            key = f'increasing_{cls}'
+            increasing = bool(z[key]) if key in z.files else True
+            # The thresholds are already monotone, so refitting on them
+            # reproduces the saved step function
+            cal = IsotonicRegression(increasing=increasing, out_of_bounds='clip')
+            cal.fit(x, y)
+            calibrator.calibrators[cls] = cal
     logger.info(f"Loaded calibrator from {path}")
     return calibrator
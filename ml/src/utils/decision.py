@@ -7,12 +7,15 @@ CRITICAL: Thresholds are tuned on VAL only, then applied to TEST.
 import numpy as np
 import pandas as pd
 from typing import Dict, Tuple
-from sklearn.metrics import f1_score, accuracy_score, confusion_matrix
+from sklearn.metrics import confusion_matrix
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Label for each probability column (binary: DOWN=-1, UP=1)
+_CLASSES_BIN = np.array([-1, 1], dtype=np.int8)
+
 
 def compute_pred_features(probs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
@@ -26,15 +29,14 @@ def compute_pred_features(probs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np
         confidence: (N,) max probability
         margin: (N,) difference between top two probabilities
     """
-    # Map indices to classes (binary: DOWN=-1, UP=1)
-    index_to_class = {0: -1, 1: 1}
+    probs = np.asarray(probs, dtype=np.float32)
     
-    # Raw prediction (argmax)
+    # Raw prediction (argmax), mapped to labels by table lookup
     pred_idx = np.argmax(probs, axis=1)
-    pred_class_raw = np.array([index_to_class[idx] for idx in pred_idx])
+    pred_class_raw = _CLASSES_BIN[pred_idx]
     
-    # Confidence (max prob)
-    confidence = np.max(probs, axis=1)
+    # Confidence (probability of the predicted class)
+    confidence = probs[np.arange(len(probs)), pred_idx]
     
     # Margin (difference between the two probabilities)
     margin = np.abs(probs[:, 0] - probs[:, 1])
@@ -70,6 +72,34 @@ def apply_gating(
     return pred_class_raw.copy()
 
 
+def _trade_rate(pred_class_final: np.ndarray) -> float:
+    """Fraction of rows with an action (non-HOLD) prediction; cheap, so check it first."""
+    return float(np.count_nonzero(pred_class_final) / len(pred_class_final))
+
+
+def _full_metrics(y_true: np.ndarray, pred_class_final: np.ndarray) -> Dict:
+    """Accuracy and macro F1 from direct label counts."""
+    # Same values as sklearn's accuracy_score / f1_score(average='macro'),
+    # without its validation layer
+    acc = float(np.mean(y_true == pred_class_final))
+    
+    f1_per_class = []
+    for cls in _CLASSES_BIN:
+        is_true = y_true == cls
+        is_pred = pred_class_final == cls
+        tp = np.count_nonzero(is_true & is_pred)
+        denom = np.count_nonzero(is_true) + np.count_nonzero(is_pred)
+        f1_per_class.append(2 * tp / denom if denom else 0.0)
+    f1_macro = float(np.mean(f1_per_class))
+    
+    # For binary, f1_action is same as f1_macro
+    return {
+        'accuracy': acc,
+        'f1_macro': f1_macro,
+        'f1_action': f1_macro
+    }
+
+
 def evaluate_gating(
     y_true: np.ndarray,
     pred_class_final: np.ndarray
@@ -82,24 +112,17 @@ def evaluate_gating(
         pred_class_final: Predictions {-1, 1}
         
     Returns:
-        metrics: Dict with accuracy, F1 scores
+        metrics: Dict with accuracy, F1 scores, trade rate
     """
-    # Overall metrics
-    acc = accuracy_score(y_true, pred_class_final)
-    f1_macro = f1_score(y_true, pred_class_final, average='macro', labels=[-1, 1])
-    
-    # For binary, f1_action is same as f1_macro
-    f1_action = f1_macro
+    y_true = np.asarray(y_true)
+    pred_class_final = np.asarray(pred_class_final)
     
-    # Trade rate is always 100% for binary (always making a prediction)
-    trade_rate = 1.0
+    # Trade rate is 100% for binary (always making a prediction)
+    trade_rate = _trade_rate(pred_class_final)
     
-    return {
-        'accuracy': acc,
-        'f1_macro': f1_macro,
-        'f1_action': f1_action,
-        'trade_rate': trade_rate
-    }
+    metrics = _full_metrics(y_true, pred_class_final)
+    metrics['trade_rate'] = trade_rate
+    return metrics
 
 
 def tune_thresholds(
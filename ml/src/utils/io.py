@@ -4,12 +4,46 @@ Supports both CSV and Supabase data sources.
 """
 
 import os
+import shutil
+import tempfile
+import time
 import pandas as pd
-from typing import Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+MAX_RETRIES = 5
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """True for rate-limit (429) and server-side (5xx) failures."""
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(exc, 'code', None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return status == 429 or 500 <= status < 600
+
+
+def _execute_with_retry(request):
+    """Execute a Supabase request, backing off exponentially on 429/5xx."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return request.execute()
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1 or not _is_retryable(e):
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"Supabase request failed ({e}); retrying in {delay}s")
+            time.sleep(delay)
+
 
 def load_from_csv(csv_path: str) -> pd.DataFrame:
     """
@@ -26,13 +60,11 @@ def load_from_csv(csv_path: str) -> pd.DataFrame:
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"CSV file not found: {csv_path}")
     
-    df = pd.read_csv(csv_path)
-    
-    # Parse date column
-    df['date'] = pd.to_datetime(df['date'])
+    # pyarrow's multithreaded reader parses dates during the read
+    df = pd.read_csv(csv_path, parse_dates=['date'], engine='pyarrow')
     
     # Sort by symbol and date (critical for time-series)
-    df = df.sort_values(['symbol', 'date']).reset_index(drop=True)
+    df = df.sort_values(['symbol', 'date'], kind='stable', ignore_index=True)
     
     logger.info(f"Loaded {len(df):,} rows, {len(df.columns)} columns")
     logger.info(f"Date range: {df['date'].min()} to {df['date'].max()}")
@@ -50,7 +82,8 @@ def load_from_csv(csv_path: str) -> pd.DataFrame:
 def load_from_supabase(
     query: Optional[str] = None,
     url: Optional[str] = None,
-    key: Optional[str] = None
+    key: Optional[str] = None,
+    view_name: str = 'v_classification_dataset_1d'
 ) -> pd.DataFrame:
     """
     Load classification dataset from Supabase.
@@ -59,6 +92,7 @@ def load_from_supabase(
         query: SQL query (optional, uses default if None)
         url: Supabase URL (reads from env if None)
         key: Supabase service role key (reads from env if None)
+        view_name: View to page through
         
     Returns:
         DataFrame with columns: symbol, date, y_class_1d, features...
@@ -94,36 +128,44 @@ def load_from_supabase(
     # Create client and fetch data
     client = create_client(url, key)
     
-    # For large datasets, we need to paginate
-    all_data = []
+    # For large datasets, we need to paginate. Count rows first so the
+    # pages can be fetched concurrently; each page becomes a columnar Arrow
+    # table as soon as it arrives instead of accumulating raw dicts.
     batch_size = 1000
-    offset = 0
-    
-    logger.info("Fetching data in batches...")
-    while True:
-        result = client.table('v_classification_dataset_1d')\
-            .select('*')\
-            .order('symbol')\
-            .order('date')\
-            .range(offset, offset + batch_size - 1)\
-            .execute()
-        
-        if not result.data:
-            break
-        
-        all_data.extend(result.data)
-        offset += batch_size
-        
-        if len(result.data) < batch_size:
-            break
-        
-        if offset % 5000 == 0:
-            logger.info(f"  Fetched {offset:,} rows...")
+    count_result = client.table(view_name)\
+        .select('*', count='exact', head=True)\
+        .execute()
+    n_rows = count_result.count or 0
+    offsets = range(0, n_rows, batch_size)
+    
+    def fetch_page(offset: int) -> pa.Table:
+        result = _execute_with_retry(
+            client.table(view_name)
+            .select('*')
+            .order('symbol')
+            .order('date')
+            .range(offset, offset + batch_size - 1)
+        )
+        return pa.Table.from_pylist(result.data)
+    
+    logger.info(f"Fetching {n_rows:,} rows in {len(offsets)} batches...")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        pages = [page for page in executor.map(fetch_page, offsets) if page.num_rows]
     
-    df = pd.DataFrame(all_data)
+    if not pages:
+        raise ValueError(f"No rows returned from {view_name}")
     
-    # Parse date column
-    df['date'] = pd.to_datetime(df['date'])
+    # Pages infer their own types (e.g. an all-null column); widen to a common schema
+    table = pa.concat_tables(pages, promote_options='permissive')
+    del pages
+    
+    # Parse date column in Arrow, before conversion
+    table = table.set_column(
+        table.schema.get_field_index('date'), 'date',
+        pc.cast(table['date'], pa.timestamp('ns'))
+    )
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    del table
     
     # Sort (should already be sorted, but ensure)
     df = df.sort_values(['symbol', 'date']).reset_index(drop=True)
@@ -141,30 +183,104 @@ def load_from_supabase(
     return df
 
 
+def _is_parquet_dataset(path: str) -> bool:
+    """True if path is something save_to_parquet wrote: a symbol-partitioned
+    dataset directory or an old single .parquet file."""
+    if os.path.isdir(path):
+        entries = os.listdir(path)
+        return all(e.startswith('symbol=') and os.path.isdir(os.path.join(path, e)) for e in entries)
+    return str(path).endswith('.parquet')
+
+
 def save_to_parquet(df: pd.DataFrame, output_path: str):
     """
     Save DataFrame to parquet for faster loading in future runs.
     
+    Written as a dataset directory partitioned by symbol, so loads restricted
+    to a few symbols only touch their files. The dataset is written to a
+    temporary sibling directory and then swapped in, so an earlier dataset
+    at output_path (or an old single .parquet file) is replaced rather than
+    appended to. Any other existing path is refused.
+    
     Args:
         df: DataFrame to save
-        output_path: Path to save parquet file
+        output_path: Directory to write the parquet dataset to
+        
+    Raises:
+        ValueError: If output_path exists and is not an earlier parquet dataset
     """
     logger.info(f"Saving data to parquet: {output_path}")
-    df.to_parquet(output_path, index=False, compression='snappy')
+    output_path = os.path.normpath(output_path)
+    if os.path.exists(output_path) and not _is_parquet_dataset(output_path):
+        raise ValueError(
+            f"Refusing to replace {output_path}: not a symbol-partitioned parquet dataset"
+        )
+    
+    parent = os.path.dirname(output_path) or '.'
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=os.path.basename(output_path) + '.tmp-', dir=parent)
+    try:
+        df.to_parquet(
+            tmp_path,
+            index=False,
+            compression='snappy',
+            partition_cols=['symbol'],
+            row_group_size=50_000
+        )
+        if os.path.exists(output_path):
+            # Move the old dataset aside so the new one lands in a single rename
+            old_path = tmp_path + '-old'
+            os.replace(output_path, old_path)
+            os.replace(tmp_path, output_path)
+            if os.path.isdir(old_path):
+                shutil.rmtree(old_path)
+            else:
+                os.remove(old_path)
+        else:
+            os.replace(tmp_path, output_path)
+    finally:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
     logger.info(f"Saved {len(df):,} rows to {output_path}")
 
 
-def load_from_parquet(parquet_path: str) -> pd.DataFrame:
+def load_from_parquet(
+    parquet_path: str,
+    symbols: Optional[List[str]] = None,
+    date_from: Optional[str] = None
+) -> pd.DataFrame:
     """
-    Load DataFrame from parquet file.
+    Load DataFrame from parquet, pruning files and row groups at read time.
     
     Args:
-        parquet_path: Path to parquet file
+        parquet_path: Path to parquet file or dataset directory
+        symbols: Only load these symbols (all if None)
+        date_from: Only load rows on or after this date (all if None)
         
     Returns:
-        DataFrame
+        DataFrame sorted by symbol and date
     """
     logger.info(f"Loading data from parquet: {parquet_path}")
-    df = pd.read_parquet(parquet_path)
+    
+    filter_ = None
+    if symbols is not None:
+        filter_ = pc.field('symbol').isin(list(symbols))
+    if date_from is not None:
+        date_filter = pc.field('date') >= pd.Timestamp(date_from)
+        filter_ = date_filter if filter_ is None else filter_ & date_filter
+    
+    # Memory-map local files so cold reads skip an extra buffer copy
+    filesystem = None if '://' in str(parquet_path) else pa.fs.LocalFileSystem(use_mmap=True)
+    dataset = ds.dataset(parquet_path, format='parquet', partitioning='hive', filesystem=filesystem)
+    table = dataset.to_table(filter=filter_, use_threads=True)
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    del table
+    
+    # Partition column comes back last; restore symbol, date first
+    if 'symbol' in df.columns and 'date' in df.columns:
+        lead = ['symbol', 'date']
+        df = df[lead + [c for c in df.columns if c not in lead]]
+        df = df.sort_values(['symbol', 'date'], ignore_index=True)
+    
     logger.info(f"Loaded {len(df):,} rows, {len(df.columns)} columns")
     return df
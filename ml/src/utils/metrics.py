@@ -4,21 +4,15 @@ Evaluation metrics for multiclass classification.
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics import (
-    accuracy_score,
-    f1_score,
-    precision_score,
-    recall_score,
-    confusion_matrix,
-    classification_report
-)
-import matplotlib.pyplot as plt
-import seaborn as sns
+from sklearn.metrics import confusion_matrix, classification_report
 from typing import Dict, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Expected class labels (binary: DOWN=-1, UP=1)
+LABELS = np.array([-1, 1])
+
 
 def compute_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
     """
@@ -31,17 +25,45 @@ def compute_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
     Returns:
         Dict of metric name -> value
     """
+    # One confusion-matrix pass over the labels; every score derives from it
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    # Index into the known labels; only unexpected labels need the concat + sort
+    classes = LABELS
+    true_idx = np.searchsorted(classes, y_true)
+    pred_idx = np.searchsorted(classes, y_pred)
+    if not (np.array_equal(classes.take(true_idx, mode='clip'), y_true)
+            and np.array_equal(classes.take(pred_idx, mode='clip'), y_pred)):
+        classes = np.unique(np.concatenate([y_true, y_pred]))
+        true_idx = np.searchsorted(classes, y_true)
+        pred_idx = np.searchsorted(classes, y_pred)
+    K = len(classes)
+    cm = np.bincount(true_idx * K + pred_idx, minlength=K * K).reshape(K, K)
+    
+    # Drop labels absent from both arrays, as sklearn does
+    present = (cm.sum(axis=0) + cm.sum(axis=1)) > 0
+    classes = classes[present]
+    cm = cm[np.ix_(present, present)]
+    
+    tp = np.diag(cm)
+    pred_count = cm.sum(axis=0)
+    support = cm.sum(axis=1)
+    total = cm.sum()
+    
+    precision = tp / np.maximum(pred_count, 1)
+    recall = tp / np.maximum(support, 1)
+    f1_denom = pred_count + support
+    f1_per_class = 2 * tp / np.maximum(f1_denom, 1)
+    
     metrics = {
-        'accuracy': accuracy_score(y_true, y_pred),
-        'f1_macro': f1_score(y_true, y_pred, average='macro'),
-        'f1_weighted': f1_score(y_true, y_pred, average='weighted'),
-        'precision_macro': precision_score(y_true, y_pred, average='macro', zero_division=0),
-        'recall_macro': recall_score(y_true, y_pred, average='macro', zero_division=0)
+        'accuracy': tp.sum() / total,
+        'f1_macro': f1_per_class.mean(),
+        'f1_weighted': (f1_per_class * support).sum() / total,
+        'precision_macro': precision.mean(),
+        'recall_macro': recall.mean()
     }
     
     # Per-class F1 scores
-    f1_per_class = f1_score(y_true, y_pred, average=None, zero_division=0)
-    classes = np.unique(np.concatenate([y_true, y_pred]))
     for i, cls in enumerate(classes):
         metrics[f'f1_class_{cls}'] = f1_per_class[i]
     
@@ -68,12 +90,54 @@ def print_classification_report(
     print(report)
 
 
+def _save_confusion_png(
+    cm_pct: np.ndarray,
+    target_names: list,
+    save_path: str,
+    title: str,
+    cell: int = 100
+):
+    """Render a percentage confusion matrix straight to PNG with Pillow."""
+    from PIL import Image, ImageDraw, ImageFont
+    
+    K = len(cm_pct)
+    left, top, bottom = 110, 40, 40
+    width, height = left + K * cell + 10, top + K * cell + bottom
+    img = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+    
+    draw.text((left + K * cell // 2, top // 2), title, fill='black', font=font, anchor='mm')
+    # White -> dark blue, roughly matching the 'Blues' colormap
+    light, dark = np.array([247, 251, 255]), np.array([8, 48, 107])
+    for i in range(K):
+        for j in range(K):
+            frac = np.nan_to_num(cm_pct[i, j]) / 100.0
+            color = tuple(int(c) for c in light + (dark - light) * frac)
+            x0, y0 = left + j * cell, top + i * cell
+            draw.rectangle([x0, y0, x0 + cell, y0 + cell], fill=color, outline='white')
+            draw.text(
+                (x0 + cell // 2, y0 + cell // 2), f"{cm_pct[i, j]:.1f}",
+                fill='white' if frac > 0.5 else 'black', font=font, anchor='mm'
+            )
+        draw.text((left - 5, top + i * cell + cell // 2), str(target_names[i]),
+                  fill='black', font=font, anchor='rm')
+        draw.text((left + i * cell + cell // 2, top + K * cell + 5), str(target_names[i]),
+                  fill='black', font=font, anchor='mt')
+    draw.text((left + K * cell // 2, height - 10), 'Predicted Label',
+              fill='black', font=font, anchor='mm')
+    draw.text((5, height - 10), 'True Label (rows)', fill='black', font=font, anchor='lm')
+    
+    img.save(save_path, optimize=True)
+
+
 def plot_confusion_matrix(
     y_true: np.ndarray,
     y_pred: np.ndarray,
     target_names: list = None,
     save_path: str = None,
-    title: str = "Confusion Matrix"
+    title: str = "Confusion Matrix",
+    fast: bool = True
 ):
     """
     Plot confusion matrix heatmap.
@@ -84,7 +148,11 @@ def plot_confusion_matrix(
         target_names: Names for each class
         save_path: Path to save figure (optional)
         title: Plot title
+        fast: Render a plain PNG with Pillow; False uses seaborn (report quality)
     """
+    if fast and not save_path:
+        return
+    
     cm = confusion_matrix(y_true, y_pred)
     
     if target_names is None:
@@ -94,6 +162,15 @@ def plot_confusion_matrix(
     # Normalize to percentages
     cm_pct = 100 * cm / cm.sum(axis=1, keepdims=True)
     
+    if fast:
+        _save_confusion_png(cm_pct, target_names, save_path, title)
+        logger.info(f"Saved confusion matrix to {save_path}")
+        return
+    
+    # Plotting libraries are only imported when a figure is drawn
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     # Create figure
     fig, ax = plt.subplots(figsize=(10, 8))
     
@@ -206,6 +283,8 @@ def compare_models(results: Dict[str, Dict[str, float]], save_path: str = None):
     
     # Create bar plot
     if save_path:
+        import matplotlib.pyplot as plt
+        
         fig, axes = plt.subplots(1, 3, figsize=(18, 5))
         
         metrics_to_plot = [
@@ -7,12 +7,172 @@ import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional, Union
+import joblib
 import logging
+import warnings
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 logger = logging.getLogger(__name__)
 
 
+def _impute_scale_np(X, fill, mean, inv_std, out):
+    """NumPy fallback for _impute_scale; returns the number of imputed values."""
+    missing = np.isnan(X)
+    tmp = np.where(missing, fill, X)
+    tmp -= mean
+    tmp *= inv_std
+    out[...] = tmp
+    return np.count_nonzero(missing)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _impute_scale(X, fill, mean, inv_std, out):
+        """
+        Fused impute + standardize: out = (X with NaNs taken from fill - mean) * inv_std.
+        
+        One pass over X with no intermediate imputed buffer; returns the
+        number of imputed values.
+        """
+        n, d = X.shape
+        n_missing = 0
+        for i in prange(n):
+            for j in range(d):
+                v = X[i, j]
+                if np.isnan(v):
+                    v = fill[j]
+                    n_missing += 1
+                out[i, j] = (v - mean[j]) * inv_std[j]
+        return n_missing
+else:
+    _impute_scale = _impute_scale_np
+
+
+def _as_matrix(df: pd.DataFrame, cols, dtype=np.float32) -> np.ndarray:
+    """
+    Select cols as one 2D array of dtype in a single materialization.
+    
+    Nullable/Arrow-backed columns map pd.NA to NaN. df[cols] is a fresh
+    frame, so the result never aliases df and may be modified in place.
+    """
+    return df[list(cols)].to_numpy(dtype=dtype, na_value=np.nan, copy=False)
+
+
+def _column_statistics(X: np.ndarray, strategy: str) -> np.ndarray:
+    """Per-column imputation statistics; NaN for columns with no observed value."""
+    with warnings.catch_warnings():
+        # All-missing columns yield NaN statistics; callers drop them
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if strategy == 'median':
+            return np.nanmedian(X, axis=0)
+        if strategy == 'mean':
+            return np.nanmean(X, axis=0)
+        return SimpleImputer(strategy=strategy).fit(X).statistics_
+
+
+def _fit_preprocessor(
+    X_values: np.ndarray,
+    columns: tuple,
+    strategy: str,
+    scaling: bool
+) -> Dict:
+    """
+    Fit the impute/scale pipeline on the kept training columns.
+    
+    A pure function of its inputs so joblib.Memory can cache it: repeated
+    fits on the same training slice (walk-forward CV, sweeps) become a
+    hash lookup. Imputation statistics come straight from NumPy
+    (nanmedian/nanmean) rather than a SimpleImputer.
+    
+    Returns:
+        Dict with empty (columns without any observed value, removed),
+        kept, statistics, scaler, n_imputed
+    """
+    X_kept = np.asarray(X_values, dtype=np.float64)
+    statistics = _column_statistics(X_kept, strategy)
+    
+    # Like SimpleImputer, drop columns with no observed value at all
+    observed = ~np.isnan(statistics)
+    if not observed.all():
+        X_kept = X_kept[:, observed]
+        statistics = statistics[observed]
+    
+    missing = np.isnan(X_kept)
+    n_imputed = int(np.count_nonzero(missing))
+    
+    scaler = None
+    if scaling:
+        np.copyto(X_kept, np.broadcast_to(statistics, X_kept.shape), where=missing)
+        scaler = StandardScaler()
+        scaler.fit(X_kept)
+    
+    return {
+        'empty': [c for c, o in zip(columns, observed) if not o],
+        'kept': [c for c, o in zip(columns, observed) if o],
+        'statistics': statistics,
+        'scaler': scaler,
+        'n_imputed': n_imputed
+    }
+
+
+def _fit_preprocessor_chunked(
+    X_kept: pd.DataFrame,
+    strategy: str,
+    scaling: bool,
+    chunk_rows: int
+) -> Dict:
+    """
+    Streaming variant of _fit_preprocessor for training frames too large
+    to copy to float64 in one go; peak extra memory is about
+    chunk_rows x n_features values.
+    
+    Statistics are computed exactly over column blocks of that size (a
+    median needs every row of its column). The scaler is fit with
+    StandardScaler.partial_fit over row chunks of the imputed data, which
+    matches a full fit up to floating-point rounding.
+    
+    Returns:
+        Same dict as _fit_preprocessor
+    """
+    n, d = X_kept.shape
+    block = max(1, chunk_rows * d // max(n, 1))
+    
+    statistics = np.empty(d, dtype=np.float64)
+    for j in range(0, d, block):
+        cols = _as_matrix(X_kept, X_kept.columns[j:j + block], np.float64)
+        statistics[j:j + block] = _column_statistics(cols, strategy)
+    
+    # Like SimpleImputer, drop columns with no observed value at all
+    observed = ~np.isnan(statistics)
+    columns = list(X_kept.columns)
+    if not observed.all():
+        X_kept = X_kept.loc[:, observed]
+        statistics = statistics[observed]
+    
+    n_imputed = 0
+    scaler = StandardScaler() if scaling else None
+    for i in range(0, n, chunk_rows):
+        chunk = X_kept.iloc[i:i + chunk_rows].to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(chunk)
+        n_imputed += int(np.count_nonzero(missing))
+        if scaler is not None:
+            np.copyto(chunk, np.broadcast_to(statistics, chunk.shape), where=missing)
+            scaler.partial_fit(chunk)
+    
+    return {
+        'empty': [c for c, o in zip(columns, observed) if not o],
+        'kept': [c for c, o in zip(columns, observed) if o],
+        'statistics': statistics,
+        'scaler': scaler,
+        'n_imputed': n_imputed
+    }
+
+
 class TimeSeriesPreprocessor:
     """
     Preprocessor for time-series classification data.
@@ -23,81 +183,142 @@ class TimeSeriesPreprocessor:
         self,
         drop_features_threshold: float = 0.30,
         imputation_strategy: str = 'median',
-        scaling: bool = True
+        scaling: bool = True,
+        memory: Union[str, joblib.Memory, None] = None,
+        dtype: np.dtype = np.float32,
+        model_family: Optional[str] = None
     ):
         """
         Args:
             drop_features_threshold: Drop features with >this fraction missing in train
             imputation_strategy: 'median', 'mean', or 'most_frequent'
             scaling: Whether to apply StandardScaler
+            memory: joblib.Memory (or cache directory) to reuse identical fits
+            dtype: Working and output dtype of transform (statistics are fit in float64)
+            model_family: 'linear', 'tree' or 'nn'; 'tree' turns scaling off since
+                tree ensembles are scale-invariant
         """
         self.drop_features_threshold = drop_features_threshold
         self.imputation_strategy = imputation_strategy
-        self.scaling = scaling
+        self.model_family = model_family
+        self.scaling = scaling and model_family != 'tree'
+        self.memory = memory
+        self.dtype = dtype
         
         self.dropped_features_ = []
         self.kept_features_ = []
-        self.imputer_ = None
+        self.statistics_ = None
         self.scaler_ = None
         self.fitted_ = False
     
-    def fit(self, X_train: pd.DataFrame) -> 'TimeSeriesPreprocessor':
+    def fit(self, X_train: pd.DataFrame, chunk_rows: Optional[int] = None) -> 'TimeSeriesPreprocessor':
         """
         Fit preprocessing pipeline on TRAINING data only.
         
         Args:
             X_train: Training features DataFrame
+            chunk_rows: If set and X_train is longer, stream the fit in chunks of
+                this many rows instead of copying the whole frame to float64
             
         Returns:
             self
         """
-        logger.info("=" * 70)
-        logger.info("FITTING PREPROCESSOR (TRAINING DATA ONLY)")
-        logger.info("=" * 70)
+        log = logger.isEnabledFor(logging.INFO)
+        if log:
+            logger.info("=" * 70)
+            logger.info("FITTING PREPROCESSOR (TRAINING DATA ONLY)")
+            logger.info("=" * 70)
         
-        # Step 1: Drop features with too many missing values
-        missing_pct = X_train.isnull().mean()
-        to_drop = missing_pct[missing_pct > self.drop_features_threshold].index.tolist()
+        # Step 1: Drop features with too many missing values. count() is a
+        # vectorized non-null count; dropped columns are never converted
+        n = len(X_train)
+        missing_pct = (n - X_train.count().to_numpy()) / n
+        drop_mask = missing_pct > self.drop_features_threshold
+        columns = X_train.columns.to_numpy()
+        kept = columns[~drop_mask].tolist()
+        
+        chunked = chunk_rows is not None and len(X_train) > chunk_rows
+        fit_fn = _fit_preprocessor_chunked if chunked else _fit_preprocessor
+        memory = getattr(self, 'memory', None)
+        if memory is not None:
+            if isinstance(memory, str):
+                memory = joblib.Memory(memory, verbose=0)
+            fit_fn = memory.cache(fit_fn)
+        
+        if chunked:
+            fitted = fit_fn(X_train[kept], self.imputation_strategy, self.scaling, chunk_rows)
+        else:
+            fitted = fit_fn(
+                _as_matrix(X_train, kept, np.float64),
+                tuple(kept),
+                self.imputation_strategy,
+                self.scaling
+            )
+        # Columns with no observed value cannot be imputed; drop them too
+        if fitted['empty']:
+            drop_mask |= X_train.columns.isin(fitted['empty'])
+        to_drop = columns[drop_mask].tolist()
         self.dropped_features_ = to_drop
-        self.kept_features_ = [c for c in X_train.columns if c not in to_drop]
+        self.kept_features_ = fitted['kept']
+        # Positions of kept_features_ for inputs laid out like X_train
+        self._train_columns = X_train.columns
+        self._kept_idx = np.flatnonzero(~drop_mask)
+        self.statistics_ = fitted['statistics']
+        self.scaler_ = fitted['scaler']
         
+        self.fitted_ = True
+        self._cache_kernel_params()
+        
+        if log:
+            self._log_fit(len(X_train), dict(zip(to_drop, missing_pct[drop_mask])), fitted['n_imputed'])
+        return self
+    
+    def _log_fit(self, n_rows: int, drop_pct: Dict[str, float], n_imputed: int):
+        """Log the fit summary (callers check the INFO level first)."""
+        to_drop = self.dropped_features_
         logger.info(f"\n1. DROPPING FEATURES (>{100*self.drop_features_threshold:.0f}% missing in train):")
         if to_drop:
             logger.info(f"   Dropped {len(to_drop)} features:")
             for feat in sorted(to_drop):
-                logger.info(f"     - {feat} ({100*missing_pct[feat]:.1f}% missing)")
+                logger.info(f"     - {feat} ({100*drop_pct[feat]:.1f}% missing)")
         else:
             logger.info("   No features dropped (all below threshold)")
         
         logger.info(f"\n   Kept {len(self.kept_features_)} features")
         
-        # Step 2: Fit imputer on kept features
-        X_train_kept = X_train[self.kept_features_]
-        self.imputer_ = SimpleImputer(strategy=self.imputation_strategy)
-        self.imputer_.fit(X_train_kept)
-        
-        # Check how many values will be imputed
-        n_imputed = X_train_kept.isnull().sum().sum()
-        total_vals = X_train_kept.size
+        # Step 2: Imputer (fit on kept features)
+        total_vals = n_rows * len(self.kept_features_)
         pct_imputed = 100 * n_imputed / total_vals
         
         logger.info(f"\n2. FITTING IMPUTER:")
         logger.info(f"   Strategy: {self.imputation_strategy}")
         logger.info(f"   Will impute {n_imputed:,} values ({pct_imputed:.2f}% of train data)")
         
-        # Step 3: Fit scaler (if enabled)
+        # Step 3: Scaler (if enabled)
         if self.scaling:
-            X_train_imputed = self.imputer_.transform(X_train_kept)
-            self.scaler_ = StandardScaler()
-            self.scaler_.fit(X_train_imputed)
             logger.info(f"\n3. FITTING SCALER:")
-            logger.info(f"   StandardScaler fit on {X_train_imputed.shape[0]:,} rows")
+            logger.info(f"   StandardScaler fit on {n_rows:,} rows")
         else:
-            logger.info(f"\n3. SCALING: Disabled")
+            reason = " (tree models are scale-invariant)" if self.__dict__.get('model_family') == 'tree' else ""
+            logger.info(f"\n3. SCALING: Disabled{reason}")
         
-        self.fitted_ = True
         logger.info("=" * 70)
-        return self
+    
+    def _cache_kernel_params(self):
+        """Flatten imputer/scaler state into the vectors _impute_scale reads."""
+        dtype = self.__dict__.get('dtype', np.float32)
+        d = len(self.kept_features_)
+        statistics = self.__dict__.get('statistics_')
+        if statistics is None:
+            # Pickled before imputation moved to NumPy
+            statistics = self.imputer_.statistics_
+        self._fill = np.ascontiguousarray(statistics, dtype=dtype)
+        if self.scaling:
+            self._mean = np.ascontiguousarray(self.scaler_.mean_, dtype=dtype)
+            self._inv_std = np.ascontiguousarray(1.0 / self.scaler_.scale_, dtype=dtype)
+        else:
+            self._mean = np.zeros(d, dtype=dtype)
+            self._inv_std = np.ones(d, dtype=dtype)
     
     def transform(self, X: pd.DataFrame, split_name: str = "") -> np.ndarray:
         """
@@ -108,41 +329,68 @@ class TimeSeriesPreprocessor:
             split_name: Name for logging (e.g., 'train', 'val', 'test')
             
         Returns:
-            Transformed numpy array
+            Transformed numpy array of self.dtype (float32 by default)
         """
         if not self.fitted_:
             raise RuntimeError("Must call fit() before transform()")
         
-        if split_name:
+        log = bool(split_name) and logger.isEnabledFor(logging.INFO)
+        if log:
             logger.info(f"\nTRANSFORMING {split_name.upper()}:")
         
-        # Step 1: Drop features
-        X_kept = X[self.kept_features_]
+        # Steps 1-3: Drop features, then impute and scale in one fused pass (narrow dtype end-to-end)
+        dtype = self.__dict__.get('dtype', np.float32)
+        imputer = self.__dict__.get('imputer_')
+        if imputer is not None and np.isnan(imputer.statistics_).any():
+            # Older pickles whose SimpleImputer drops all-missing columns
+            X_kept = X[self.kept_features_]
+            X_out = imputer.transform(X_kept)
+            # Only the log line needs the count; skip the scan otherwise
+            n_imputed = None
+            if log:
+                n_imputed = X_kept.size - int(X_kept.count().sum())
+            if self.scaling:
+                # In place against the cached reciprocal; skips sklearn's validation
+                np.subtract(X_out, self.scaler_.mean_, out=X_out)
+                np.multiply(X_out, 1.0 / self.scaler_.scale_, out=X_out)
+            X_out = X_out.astype(dtype)
+        else:
+            # Preprocessors pickled before the fused kernel lack the cached vectors
+            if '_fill' not in self.__dict__:
+                self._cache_kernel_params()
+            train_columns = self.__dict__.get('_train_columns')
+            if train_columns is not None and X.columns.equals(train_columns):
+                # Same layout as X_train: gather by position, no label lookups
+                X_arr = X.iloc[:, self._kept_idx].to_numpy(dtype=dtype, na_value=np.nan, copy=False)
+            else:
+                X_arr = _as_matrix(X, self.kept_features_, dtype)
+            if self.scaling:
+                X_out = np.empty(X_arr.shape, dtype=dtype)
+                n_imputed = _impute_scale(X_arr, self._fill, self._mean, self._inv_std, X_out)
+            else:
+                # Impute only, in place (X_arr never aliases X)
+                missing = np.isnan(X_arr)
+                n_imputed = np.count_nonzero(missing)
+                np.copyto(X_arr, np.broadcast_to(self._fill, X_arr.shape), where=missing)
+                X_out = np.ascontiguousarray(X_arr)
         
-        # Step 2: Impute
-        X_imputed = self.imputer_.transform(X_kept)
-        n_imputed = np.isnan(X_kept.values).sum()
-        if split_name:
+        if log:
             logger.info(f"  Imputed {n_imputed:,} missing values")
         
-        # Step 3: Scale
-        if self.scaling:
-            X_scaled = self.scaler_.transform(X_imputed)
-            return X_scaled
-        else:
-            return X_imputed
+        return X_out
     
-    def fit_transform(self, X_train: pd.DataFrame) -> np.ndarray:
+    def fit_transform(self, X_train: pd.DataFrame, chunk_rows: Optional[int] = None) -> np.ndarray:
         """
         Fit on training data and transform it.
         
         Args:
             X_train: Training features DataFrame
+            chunk_rows: Passed to fit()
             
         Returns:
             Transformed training data
         """
-        self.fit(X_train)
+        self.fit(X_train, chunk_rows=chunk_rows)
         return self.transform(X_train, split_name='train')
     
     def get_feature_names(self) -> List[str]:
@@ -162,17 +410,18 @@ def compute_class_weights(y_train: pd.Series) -> Dict[int, float]:
     Returns:
         Dict mapping class label to weight
     """
-    from sklearn.utils.class_weight import compute_class_weight
-    
-    classes = np.unique(y_train)
-    weights = compute_class_weight('balanced', classes=classes, y=y_train)
+    # One pass for all class counts; 'balanced' weight is n / (n_classes * count),
+    # exactly as sklearn's compute_class_weight
+    y_arr = np.asarray(y_train)
+    classes, counts = np.unique(y_arr, return_counts=True)
+    weights = len(y_arr) / (len(classes) * counts.astype(np.float64))
     
     weight_dict = dict(zip(classes, weights))
     
-    logger.info("\nCLASS WEIGHTS (for imbalanced data):")
-    for cls in sorted(weight_dict.keys()):
-        count = (y_train == cls).sum()
-        pct = 100 * count / len(y_train)
-        logger.info(f"  Class {cls:2d}: weight={weight_dict[cls]:.3f} (n={count:,}, {pct:.1f}%)")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("\nCLASS WEIGHTS (for imbalanced data):")
+        for cls, weight, count in zip(classes, weights, counts):
+            pct = 100 * count / len(y_arr)
+            logger.info(f"  Class {cls:2d}: weight={weight:.3f} (n={count:,}, {pct:.1f}%)")
     
     return weight_dict
@@ -3,6 +3,7 @@ Time-series safe train/val/test splits.
 CRITICAL: No random splits - only chronological splits.
 """
 
+import numpy as np
 import pandas as pd
 from typing import Tuple, Dict
 import logging
@@ -49,41 +50,58 @@ def create_time_splits(
     if val_end >= test_start:
         raise ValueError("Val and test periods overlap!")
     
-    # Create splits
-    train_df = df[(df['date'] >= train_start) & (df['date'] <= train_end)].copy()
-    val_df = df[(df['date'] >= val_start) & (df['date'] <= val_end)].copy()
-    test_df = df[(df['date'] >= test_start) & (df['date'] <= test_end)].copy()
+    # Create splits: bucket every row against the six boundaries in one
+    # pass (odd buckets 1/3/5 are train/val/test), then partition once.
+    # A stable sort keeps each split in the original row order.
+    one_ns = pd.Timedelta(1, 'ns')
+    edges = pd.DatetimeIndex([
+        train_start, train_end + one_ns,
+        val_start, val_end + one_ns,
+        test_start, test_end + one_ns
+    ]).to_numpy()
+    if not (np.diff(edges) >= np.timedelta64(0, 'ns')).all():
+        raise ValueError("Each split must start on or before its end date!")
     
-    # Log split info
-    logger.info("=" * 70)
-    logger.info("TIME-BASED SPLITS (NO RANDOM SAMPLING)")
-    logger.info("=" * 70)
+    bucket = np.searchsorted(edges, df['date'].to_numpy(), side='right')
+    order = np.argsort(bucket, kind='stable')
+    bounds = np.searchsorted(bucket[order], [1, 2, 3, 4, 5, 6], side='left')
     
-    logger.info(f"\nTRAIN: {train_start.date()} to {train_end.date()}")
-    logger.info(f"  Rows: {len(train_df):,}")
-    logger.info(f"  Symbols: {sorted(train_df['symbol'].unique())}")
-    logger.info(f"  Class distribution:")
-    for cls, count in train_df[target_col].value_counts().sort_index().items():
-        pct = 100 * count / len(train_df)
-        logger.info(f"    {cls:2d}: {count:5d} ({pct:5.2f}%)")
+    # take() already returns new frames, so no extra .copy()
+    train_df = df.take(order[bounds[0]:bounds[1]])
+    val_df = df.take(order[bounds[2]:bounds[3]])
+    test_df = df.take(order[bounds[4]:bounds[5]])
     
-    logger.info(f"\nVAL:   {val_start.date()} to {val_end.date()}")
-    logger.info(f"  Rows: {len(val_df):,}")
-    logger.info(f"  Symbols: {sorted(val_df['symbol'].unique())}")
-    logger.info(f"  Class distribution:")
-    for cls, count in val_df[target_col].value_counts().sort_index().items():
-        pct = 100 * count / len(val_df)
-        logger.info(f"    {cls:2d}: {count:5d} ({pct:5.2f}%)")
-    
-    logger.info(f"\nTEST:  {test_start.date()} to {test_end.date()}")
-    logger.info(f"  Rows: {len(test_df):,}")
-    logger.info(f"  Symbols: {sorted(test_df['symbol'].unique())}")
-    logger.info(f"  Class distribution:")
-    for cls, count in test_df[target_col].value_counts().sort_index().items():
-        pct = 100 * count / len(test_df)
-        logger.info(f"    {cls:2d}: {count:5d} ({pct:5.2f}%)")
-    
-    logger.info("=" * 70)
+    # Log split info: class counts for all three splits from one
+    # unique/bincount pass, emitted as a single message
+    if logger.isEnabledFor(logging.INFO):
+        selected = np.concatenate([
+            order[bounds[0]:bounds[1]],
+            order[bounds[2]:bounds[3]],
+            order[bounds[4]:bounds[5]]
+        ])
+        classes, y_idx = np.unique(df[target_col].to_numpy()[selected], return_inverse=True)
+        sizes = [len(train_df), len(val_df), len(test_df)]
+        split_idx = np.repeat(np.arange(3), sizes)
+        K = len(classes)
+        counts = np.bincount(split_idx * K + y_idx, minlength=3 * K).reshape(3, K)
+        
+        lines = ["=" * 70, "TIME-BASED SPLITS (NO RANDOM SAMPLING)", "=" * 70]
+        periods = [
+            ("TRAIN:", train_start, train_end, train_df),
+            ("VAL:  ", val_start, val_end, val_df),
+            ("TEST: ", test_start, test_end, test_df),
+        ]
+        for i, (label, start, end, split_df) in enumerate(periods):
+            lines.append(f"\n{label} {start.date()} to {end.date()}")
+            lines.append(f"  Rows: {sizes[i]:,}")
+            lines.append(f"  Symbols: {sorted(split_df['symbol'].unique())}")
+            lines.append(f"  Class distribution:")
+            for cls, count in zip(classes, counts[i]):
+                if count:
+                    pct = 100 * count / sizes[i]
+                    lines.append(f"    {cls:2d}: {count:5d} ({pct:5.2f}%)")
+        lines.append("=" * 70)
+        logger.info("\n".join(lines))
     
     # Validate non-empty
     if len(train_df) == 0:
@@ -0,0 +1,26 @@
+"""
+Bind the training target column for the per-horizon training scripts.
+"""
+
+import functools
+
+BOUND_FUNCTIONS = ('prepare_X_y', 'create_time_splits')
+
+
+def bind_target(target_col: str, module) -> None:
+    """
+    Rebind module's prepare_X_y/create_time_splits to use target_col.
+    
+    Pass the module that calls them (train_models imports both names with
+    `from ... import`, so patching the splits module would not reach it).
+    The functools.partial is C-level and adds no Python wrapper frame.
+    
+    Args:
+        target_col: Target column, e.g. 'y_class_1d' or 'y_class_5d'
+        module: Module whose globals hold the split functions
+    """
+    for name in BOUND_FUNCTIONS:
+        fn = getattr(module, name)
+        # Rebinding replaces an earlier binding instead of stacking partials
+        fn = getattr(fn, 'func', fn)
+        setattr(module, name, functools.partial(fn, target_col=target_col))
@@ -0,0 +1,47 @@
+"""
+XGBoost classifier wrapper that maps class indices back to labels.
+
+Lives in its own module so pickled models resolve to a single class
+from training and every prediction entry point.
+"""
+
+import numpy as np
+
+
+class XGBWrapper:
+    """Wrapper for XGBoost that handles label mapping for classification."""
+    def __init__(self, model, label_mapping):
+        self.model = model
+        self.label_mapping = label_mapping  # {0: -1, 1: 0, 2: 1}
+    
+    def predict(self, X):
+        # Predict with mapped labels (0,1,2) and convert back to (-1,0,1)
+        preds_mapped = self._predict_index(X)
+        return self._label_lut()[preds_mapped.astype(np.intp)]
+    
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+    
+    @property
+    def classes_(self):
+        # Labels in predict_proba column order
+        return self._label_lut()
+    
+    def _predict_index(self, X):
+        # Booster in-place predict, skipping the sklearn wrapper; class index
+        # computed as XGBClassifier.predict does (honours early stopping)
+        best = getattr(self.model, 'best_iteration', None)
+        iteration_range = (0, best + 1) if best is not None else (0, 0)
+        probs = self.model.get_booster().inplace_predict(X, iteration_range=iteration_range)
+        if probs.ndim == 1:
+            return probs > 0.5
+        return probs.argmax(axis=1)
+    
+    def _label_lut(self):
+        # Class index -> label lookup table; built lazily so pickles
+        # saved before it existed still load
+        lut = self.__dict__.get('_lut')
+        if lut is None:
+            lut = np.array([self.label_mapping[i] for i in sorted(self.label_mapping)])
+            self._lut = lut
+        return lut
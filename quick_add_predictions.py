@@ -15,14 +15,10 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from etl.supabase_client import SupabaseDB
 
-def load_model_and_predict(horizon='1d'):
-    """Load model and generate predictions."""
-    db = SupabaseDB()
-    
-    # Get SPY asset info
-    asset_result = db.client.table('assets').select('id, symbol').eq('symbol', 'SPY').single().execute()
-    asset_id = asset_result.data['id']
-    symbol = asset_result.data['symbol']
+def load_model_and_predict(db: SupabaseDB, asset: dict, horizon='1d') -> list:
+    """Build placeholder prediction rows for dates missing in horizon (not inserted)."""
+    asset_id = asset['id']
+    symbol = asset['symbol']
     
     # Get dates with features but no predictions
     features_result = db.client.table('features_daily')\
@@ -53,8 +49,7 @@ def load_model_and_predict(horizon='1d'):
     
     if not missing_dates:
         print(f"✓ No missing predictions for {horizon}")
-        db.close()
-        return
+        return []
     
     print(f"Found {len(missing_dates)} dates needing predictions:")
     for row in missing_dates:
@@ -66,40 +61,49 @@ def load_model_and_predict(horizon='1d'):
     print(f"   To use actual trained models, run the full prediction script:")
     print(f"   cd ml && python src/predict/predict_and_store.py --data_source supabase --horizon all --store_db")
     
+    # Simple default prediction (you should use actual model)
+    # This is just to populate the database
+    p_up = 0.55
+    p_down = 0.45
+    pred_class = 1  # UP
+    template = {
+        'horizon': horizon,
+        'model_name': 'placeholder_xgb',
+        'split': 'production',
+        'y_true': None,
+        'pred_class_raw': pred_class,
+        'pred_class_final': pred_class,
+        'p_down': p_down,
+        'p_up': p_up,
+        'confidence': p_up,
+        'margin': abs(p_up - p_down)
+    }
+    
     # Generate simple predictions for each missing date
+    predictions_to_insert = [
+        {'symbol': symbol, 'date': row['date'], **template} for row in missing_dates
+    ]
+    
+    return predictions_to_insert
+
+if __name__ == '__main__':
+    print("Generating placeholder predictions for missing dates...")
+    print("These are default probabilities - use actual model predictions in production!")
+    
+    db = SupabaseDB()
+    
+    # Get SPY asset info
+    asset = db.client.table('assets').select('id, symbol').eq('symbol', 'SPY').single().execute().data
+    
+    # Generate for both horizons, then insert everything in one upsert
     predictions_to_insert = []
-    for row in missing_dates:
-        date = row['date']
-        
-        # Simple default prediction (you should use actual model)
-        # This is just to populate the database
-        p_up = 0.55
-        p_down = 0.45
-        pred_class = 1  # UP
-        confidence = p_up
-        
-        pred_data = {
-            'symbol': symbol,
-            'date': date,
-            'horizon': horizon,
-            'model_name': 'placeholder_xgb',
-            'split': 'production',
-            'y_true': None,
-            'pred_class_raw': pred_class,
-            'pred_class_final': pred_class,
-            'p_down': p_down,
-            'p_up': p_up,
-            'confidence': confidence,
-            'margin': abs(p_up - p_down)
-        }
-        
-        predictions_to_insert.append(pred_data)
-    
-    # Insert predictions
+    for horizon in ('1d', '5d'):
+        predictions_to_insert.extend(load_model_and_predict(db, asset, horizon))
+    
     if predictions_to_insert:
         print(f"\nInserting {len(predictions_to_insert)} predictions...")
         try:
-            result = db.client.table('model_predictions_classification').upsert(
+            db.client.table('model_predictions_classification').upsert(
                 predictions_to_insert,
                 on_conflict='symbol,date,horizon,model_name,split'
             ).execute()
@@ -108,14 +112,6 @@ def load_model_and_predict(horizon='1d'):
             print(f"✗ Error inserting predictions: {e}")
     
     db.close()
-
-if __name__ == '__main__':
-    print("Generating placeholder predictions for missing dates...")
-    print("These are default probabilities - use actual model predictions in production!")
-    
-    # Generate for both horizons
-    load_model_and_predict('1d')
-    load_model_and_predict('5d')
     
     print("\n" + "="*60)
     print("✓ Done! Check your website - predictions should now appear.")
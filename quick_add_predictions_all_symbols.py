@@ -4,8 +4,10 @@ This script generates predictions for any missing dates across all symbols.
 """
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import pandas_market_calendars as mcal
 
 load_dotenv()
 sys.path.insert(0, os.path.dirname(__file__))
@@ -14,110 +16,92 @@ from etl.supabase_client import SupabaseDB
 
 # All symbols to process
 SYMBOLS = ['SPY', 'QQQ', 'IWM', 'DIA']
+HORIZONS = ['1d', '5d']
 
-def generate_predictions_for_symbol(db: SupabaseDB, symbol: str, horizon: str):
-    """Generate predictions for a single symbol and horizon."""
-    import pandas_market_calendars as mcal
-    from datetime import datetime
-    
-    # Get asset ID
-    try:
-        asset_result = db.client.table('assets').select('id').eq('symbol', symbol).single().execute()
-        asset_id = asset_result.data['id']
-    except Exception as e:
-        print(f"  ⚠️  Symbol {symbol} not found in assets table. Skipping.")
-        return 0
+# NYSE calendar, built once per process
+_NYSE = mcal.get_calendar('NYSE')
+
+# Default prediction (replace with actual model in production); only
+# symbol, date and horizon vary per row
+_P_UP, _P_DOWN = 0.55, 0.45
+PLACEHOLDER_PREDICTION = {
+    'model_name': 'placeholder_xgb',
+    'split': 'production',
+    'y_true': None,
+    'pred_class_raw': 1,  # UP
+    'pred_class_final': 1,
+    'p_down': _P_DOWN,
+    'p_up': _P_UP,
+    'confidence': _P_UP,
+    'margin': abs(_P_UP - _P_DOWN)
+}
+
+# Window for the bulk feature-date lookup (calendar days)
+LOOKBACK_DAYS = 30
+
+
+def _latest_feature_date(db: SupabaseDB, asset_id):
+    """Latest features_daily date for a single asset, or None."""
+    result = db.client.table('features_daily')\
+        .select('date')\
+        .eq('asset_id', asset_id)\
+        .order('date', desc=True)\
+        .limit(1)\
+        .execute()
+    return result.data[0]['date'] if result.data else None
+
+
+def fetch_latest_feature_dates(db: SupabaseDB, sym2id: dict) -> dict:
+    """Return {symbol: latest features_daily date} with one bulk query."""
+    cutoff = (datetime.now().date() - timedelta(days=LOOKBACK_DAYS)).isoformat()
+    id2sym = {asset_id: sym for sym, asset_id in sym2id.items()}
     
-    # Get the latest date with features
-    try:
-        latest_result = db.client.table('features_daily')\
-            .select('date')\
-            .eq('asset_id', asset_id)\
-            .order('date', desc=True)\
-            .limit(1)\
-            .execute()
-        
-        if not latest_result.data:
-            print(f"  ⚠️  No features found for {symbol}")
-            return 0
-        
-        latest_date = latest_result.data[0]['date']
-        print(f"  Latest feature date: {latest_date}")
-        
-        # Find next trading day after latest_date
-        nyse = mcal.get_calendar('NYSE')
-        latest_dt = datetime.fromisoformat(latest_date).date()
-        schedule = nyse.schedule(start_date=latest_dt, end_date=latest_dt + timedelta(days=10))
-        
-        if len(schedule) <= 1:
-            print(f"  ⚠️  No future trading days found after {latest_date}")
-            return 0
-        
-        next_trading_day = schedule.index[1].date().isoformat()
-        print(f"  Next trading day (prediction target): {next_trading_day}")
-        
-    except Exception as e:
-        print(f"  ⚠️  Error finding dates: {e}")
-        return 0
+    result = db.client.table('features_daily')\
+        .select('asset_id,date')\
+        .in_('asset_id', list(sym2id.values()))\
+        .gte('date', cutoff)\
+        .execute()
     
-    # Check if prediction already exists for next trading day
-    try:
-        pred_result = db.client.table('model_predictions_classification')\
-            .select('date')\
-            .eq('symbol', symbol)\
-            .eq('horizon', horizon)\
-            .eq('date', next_trading_day)\
-            .execute()
-        
-        if pred_result.data:
-            print(f"  ✓ Prediction already exists for {next_trading_day}")
-            return 0
-    except:
-        pass
+    latest = {}
+    for row in result.data:
+        sym = id2sym[row['asset_id']]
+        if row['date'] > latest.get(sym, ''):
+            latest[sym] = row['date']
     
-    # We need to predict for the next trading day
-    missing_dates = [next_trading_day]
-    print(f"  Generating prediction for {next_trading_day}")
+    # Symbols with no rows in the window: fall back to single-row lookups,
+    # run concurrently so their round-trips overlap
+    missing = [sym for sym in sym2id if sym not in latest]
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as ex:
+            futures = {ex.submit(_latest_feature_date, db, sym2id[sym]): sym for sym in missing}
+            for future in as_completed(futures):
+                date = future.result()
+                if date:
+                    latest[futures[future]] = date
     
-    # Generate predictions (using placeholder values)
-    predictions_to_insert = []
-    for date in missing_dates:
-        # Default prediction (replace with actual model in production)
-        p_up = 0.55
-        p_down = 0.45
-        pred_class = 1  # UP
-        confidence = p_up
-        
-        pred_data = {
-            'symbol': symbol,
-            'date': date,
-            'horizon': horizon,
-            'model_name': 'placeholder_xgb',
-            'split': 'production',
-            'y_true': None,
-            'pred_class_raw': pred_class,
-            'pred_class_final': pred_class,
-            'p_down': p_down,
-            'p_up': p_up,
-            'confidence': confidence,
-            'margin': abs(p_up - p_down)
-        }
-        
-        predictions_to_insert.append(pred_data)
+    return latest
+
+
+def next_trading_days(latest_dates: dict) -> dict:
+    """Map {symbol: latest date} to {symbol: next NYSE trading day} from one schedule."""
+    if not latest_dates:
+        return {}
     
-    # Insert predictions
-    if predictions_to_insert:
-        try:
-            result = db.client.table('model_predictions_classification').upsert(
-                predictions_to_insert,
-                on_conflict='symbol,date,horizon,model_name,split'
-            ).execute()
-            return len(predictions_to_insert)
-        except Exception as e:
-            print(f"  ✗ Error inserting predictions: {e}")
-            return 0
+    dates = {sym: datetime.fromisoformat(d).date() for sym, d in latest_dates.items()}
+    schedule = _NYSE.schedule(
+        start_date=min(dates.values()),
+        end_date=max(dates.values()) + timedelta(days=10)
+    )
+    sessions = [ts.date() for ts in schedule.index]
     
-    return 0
+    targets = {}
+    for sym, latest_dt in dates.items():
+        # Second session on/after latest_dt, within the 10-day window
+        window = [d for d in sessions if latest_dt <= d <= latest_dt + timedelta(days=10)]
+        if len(window) > 1:
+            targets[sym] = window[1].isoformat()
+    return targets
+
 
 def main():
     """Generate predictions for all symbols."""
@@ -130,28 +114,78 @@ def main():
     
     db = SupabaseDB()
     
-    total_predictions = 0
+    # Bulk lookups: 3 round-trips for all symbols instead of 3 per (symbol, horizon)
+    assets = db.client.table('assets').select('id,symbol').in_('symbol', SYMBOLS).execute()
+    sym2id = {row['symbol']: row['id'] for row in assets.data}
+    
+    try:
+        latest_dates = fetch_latest_feature_dates(db, sym2id) if sym2id else {}
+        targets = next_trading_days(latest_dates)
+    except Exception as e:
+        print(f"  ⚠️  Error finding dates: {e}")
+        latest_dates, targets = {}, {}
+    
+    existing = set()
+    if targets:
+        try:
+            pred_result = db.client.table('model_predictions_classification')\
+                .select('symbol,horizon,date')\
+                .in_('symbol', list(targets))\
+                .in_('date', sorted(set(targets.values())))\
+                .execute()
+            existing = {(r['symbol'], r['horizon'], r['date']) for r in pred_result.data}
+        except:
+            pass
+    
+    predictions_to_insert = []
+    counts = {}
     
     for symbol in SYMBOLS:
         print(f"\n📊 Processing {symbol}...")
         
-        # Generate 1d predictions
-        print(f"  → 1-day horizon...")
-        count_1d = generate_predictions_for_symbol(db, symbol, '1d')
-        if count_1d > 0:
-            print(f"    ✓ Inserted {count_1d} predictions")
+        if symbol not in sym2id:
+            print(f"  ⚠️  Symbol {symbol} not found in assets table. Skipping.")
+            continue
+        if symbol not in latest_dates:
+            print(f"  ⚠️  No features found for {symbol}")
+            continue
         
-        # Generate 5d predictions
-        print(f"  → 5-day horizon...")
-        count_5d = generate_predictions_for_symbol(db, symbol, '5d')
-        if count_5d > 0:
-            print(f"    ✓ Inserted {count_5d} predictions")
+        print(f"  Latest feature date: {latest_dates[symbol]}")
+        if symbol not in targets:
+            print(f"  ⚠️  No future trading days found after {latest_dates[symbol]}")
+            continue
         
-        total_predictions += count_1d + count_5d
+        next_trading_day = targets[symbol]
+        print(f"  Next trading day (prediction target): {next_trading_day}")
         
-        if count_1d == 0 and count_5d == 0:
+        for horizon in HORIZONS:
+            print(f"  → {horizon[:-1]}-day horizon...")
+            if (symbol, horizon, next_trading_day) in existing:
+                print(f"  ✓ Prediction already exists for {next_trading_day}")
+                continue
+            print(f"  Generating prediction for {next_trading_day}")
+            predictions_to_insert.append(
+                {'symbol': symbol, 'date': next_trading_day, 'horizon': horizon, **PLACEHOLDER_PREDICTION}
+            )
+            counts[symbol] = counts.get(symbol, 0) + 1
+        
+        if not counts.get(symbol):
             print(f"  ✓ All predictions up to date for {symbol}")
     
+    # Insert all predictions in one batched upsert
+    total_predictions = 0
+    if predictions_to_insert:
+        try:
+            db.client.table('model_predictions_classification').upsert(
+                predictions_to_insert,
+                on_conflict='symbol,date,horizon,model_name,split'
+            ).execute()
+            total_predictions = len(predictions_to_insert)
+            for symbol, count in counts.items():
+                print(f"    ✓ Inserted {count} predictions for {symbol}")
+        except Exception as e:
+            print(f"  ✗ Error inserting predictions: {e}")
+    
     db.close()
     
     print("\n" + "="*70)
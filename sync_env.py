@@ -19,10 +19,20 @@ def sync_env():
     print(f"Found URL: {url[:15]}...")
     print(f"Found KEY: {key[:10]}...")
 
-    content = f"NEXT_PUBLIC_SUPABASE_URL={url}\nNEXT_PUBLIC_SUPABASE_KEY={key}\n"
+    payload = f"NEXT_PUBLIC_SUPABASE_URL={url}\nNEXT_PUBLIC_SUPABASE_KEY={key}\n".encode('utf-8')
     
-    with open('web/.env.local', 'w', encoding='utf-8') as f:
-        f.write(content)
+    # Write a private temp file with raw fd writes, then swap it in atomically
+    # so readers never see a half-written .env.local
+    target = os.path.join('web', '.env.local')
+    tmp = f"{target}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    os.replace(tmp, target)
         
     print("✅ Successfully wrote web/.env.local")
 
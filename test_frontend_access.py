@@ -4,18 +4,19 @@ from supabase import create_client
 
 def test_access():
     # 1. Read frontend credentials manually
-    url = None
-    key = None
+    wanted = {'NEXT_PUBLIC_SUPABASE_URL': None, 'NEXT_PUBLIC_SUPABASE_KEY': None}
     try:
         with open('web/.env.local', 'r') as f:
             for line in f:
-                if 'NEXT_PUBLIC_SUPABASE_URL=' in line:
-                    url = line.split('=')[1].strip()
-                if 'NEXT_PUBLIC_SUPABASE_KEY=' in line:
-                    key = line.split('=')[1].strip()
+                # partition keeps any '=' inside the value
+                k, sep, v = line.partition('=')
+                k = k.strip()
+                if sep and k in wanted:
+                    wanted[k] = v.strip()
     except Exception as e:
         print(f"Error reading .env.local: {e}")
         return
+    url, key = wanted['NEXT_PUBLIC_SUPABASE_URL'], wanted['NEXT_PUBLIC_SUPABASE_KEY']
 
     if not url or not key:
         print("Could not find URL or KEY in web/.env.local")
@@ -2,25 +2,50 @@
 Test the workflow locally before running on GitHub Actions.
 This simulates what GitHub Actions will do.
 """
-import subprocess
+import runpy
 import sys
 import os
 
-def run_command(cmd, description):
-    """Run a command and print results."""
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# (script, args, description) for each workflow step
+STEPS = [
+    ("run_etl.py", ["--mode", "incremental"], "ETL Pipeline (update to latest trading day)"),
+    ("quick_add_predictions_all_symbols.py", [], "Generate Predictions (next trading day)"),
+    ("verify_all_predictions.py", [], "Verify Predictions"),
+]
+
+def run_step(script, args, description):
+    """
+    Run a step's script in this interpreter and print results.
+    
+    Steps share one process, so pandas/numpy/supabase imports are paid once
+    instead of once per `python script.py` subprocess.
+    """
     print("\n" + "="*70)
     print(f"Running: {description}")
     print("="*70)
-    print(f"Command: {cmd}")
+    print(f"Command: python {' '.join([script] + args)}")
     print()
     
-    result = subprocess.run(cmd, shell=True, capture_output=False)
+    saved_argv = sys.argv
+    sys.argv = [script] + args
+    try:
+        runpy.run_path(os.path.join(ROOT, script), run_name='__main__')
+        returncode = 0
+    except SystemExit as e:
+        returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        print(f"{type(e).__name__}: {e}")
+        returncode = 1
+    finally:
+        sys.argv = saved_argv
     
-    if result.returncode == 0:
+    if returncode == 0:
         print("\n✅ Success")
         return True
     else:
-        print(f"\n❌ Failed with exit code {result.returncode}")
+        print(f"\n❌ Failed with exit code {returncode}")
         return False
 
 def main():
@@ -46,20 +71,9 @@ def main():
     
     print("✅ All environment variables are set\n")
     
-    # Test Step 1: ETL
-    if not run_command("python run_etl.py --mode incremental", 
-                      "ETL Pipeline (update to latest trading day)"):
-        return False
-    
-    # Test Step 2: Predictions
-    if not run_command("python quick_add_predictions_all_symbols.py", 
-                      "Generate Predictions (next trading day)"):
-        return False
-    
-    # Test Step 3: Verification
-    if not run_command("python verify_all_predictions.py", 
-                      "Verify Predictions"):
-        return False
+    for script, args, description in STEPS:
+        if not run_step(script, args, description):
+            return False
     
     print("\n" + "="*70)
     print("✅ ALL TESTS PASSED!")
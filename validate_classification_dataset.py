@@ -10,15 +10,18 @@ Validates:
 
 Usage:
     python validate_classification_dataset.py --supabase
+    python validate_classification_dataset.py --counts-only  # aggregate checks computed server-side
 
 Date: 2025-12-14
 """
 
+from __future__ import annotations
+
 import os
 import sys
 import argparse
-import pandas as pd
-from typing import Dict, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -27,21 +30,68 @@ load_dotenv()
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from etl.supabase_client import SupabaseDB
+# pandas/numpy/pyarrow and the Supabase client are imported where they are
+# used, so --sql-only and --counts-only never pay the pandas import
+if TYPE_CHECKING:
+    import pandas as pd
+    from etl.supabase_client import SupabaseDB
+
+# Credentials read once after load_dotenv()
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+
+_DB = None
+
+# Rows per request when paging Supabase views (PostgREST's default max-rows)
+PAGE_SIZE = 1000
+
+
+def get_db() -> SupabaseDB:
+    """Shared Supabase client, created on first use."""
+    global _DB
+    if _DB is None:
+        from etl.supabase_client import SupabaseDB
+        _DB = SupabaseDB(url=SUPABASE_URL, key=SUPABASE_KEY)
+    return _DB
+
+
+def _summarize_targets(df: pd.DataFrame) -> Dict:
+    """
+    One pass over y_class_1d shared by the target checks: the null mask and
+    the non-null class values with their counts.
+    """
+    import numpy as np
+    import pandas as pd
+    
+    y = df['y_class_1d'].to_numpy()
+    isna = pd.isna(y)
+    classes, counts = np.unique(y[~isna], return_counts=True)
+    return {'isna': isna, 'classes': classes, 'counts': counts}
 
 
-def validate_no_nulls(df: pd.DataFrame, warmup_days: int = 252) -> Tuple[bool, str]:
+def validate_no_nulls(df: pd.DataFrame, warmup_days: int = 252, summary: Dict = None) -> Tuple[bool, str]:
     """Check for NULL in y_class_1d beyond warm-up period."""
     if 'y_class_1d' not in df.columns:
         return False, "Column 'y_class_1d' not found in dataset"
+    import numpy as np
+    import pandas as pd
     
-    min_date = df['date'].min()
-    warmup_end = pd.to_datetime(min_date) + pd.Timedelta(days=warmup_days)
-    df_after_warmup = df[pd.to_datetime(df['date']) > warmup_end]
+    if summary is None:
+        summary = _summarize_targets(df)
     
-    null_count = df_after_warmup['y_class_1d'].isna().sum()
-    total_rows = len(df_after_warmup)
+    # Parse once (cache dedupes repeated date strings); skip if already datetime
+    dates = df['date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, cache=True)
+    warmup_end = dates.min() + pd.Timedelta(days=warmup_days)
+    after_warmup = (dates > warmup_end).to_numpy()
     
+    null_count = int(np.count_nonzero(summary['isna'] & after_warmup))
+    total_rows = int(np.count_nonzero(after_warmup))
+    return _no_nulls_result(null_count, total_rows, warmup_days)
+
+
+def _no_nulls_result(null_count: int, total_rows: int, warmup_days: int) -> Tuple[bool, str]:
     if null_count == 0:
         return True, f"✓ No NULL in y_class_1d after {warmup_days}-day warm-up ({total_rows} rows checked)"
     else:
@@ -49,13 +99,15 @@ def validate_no_nulls(df: pd.DataFrame, warmup_days: int = 252) -> Tuple[bool, s
         return False, f"✗ Found {null_count} NULL in y_class_1d ({pct:.2f}% of {total_rows} rows)"
 
 
-def validate_valid_classes(df: pd.DataFrame) -> Tuple[bool, str]:
+def validate_valid_classes(df: pd.DataFrame, summary: Dict = None) -> Tuple[bool, str]:
     """Check that all class values are -1, 0, or 1."""
     if 'y_class_1d' not in df.columns:
         return False, "Column 'y_class_1d' not found"
+    if summary is None:
+        summary = _summarize_targets(df)
     
     valid_values = {-1, 0, 1}
-    actual_values = set(df['y_class_1d'].dropna().unique())
+    actual_values = set(summary['classes'])
     invalid = actual_values - valid_values
     
     if len(invalid) == 0:
@@ -64,14 +116,19 @@ def validate_valid_classes(df: pd.DataFrame) -> Tuple[bool, str]:
         return False, f"✗ Found invalid class values: {invalid}"
 
 
-def validate_class_balance(df: pd.DataFrame) -> Tuple[bool, str]:
+def validate_class_balance(df: pd.DataFrame, summary: Dict = None) -> Tuple[bool, str]:
     """Check class distribution and warn if Hold > 85%."""
     if 'y_class_1d' not in df.columns:
         return False, "Column 'y_class_1d' not found"
+    if summary is None:
+        summary = _summarize_targets(df)
     
-    counts = df['y_class_1d'].value_counts()
-    total = counts.sum()
-    
+    counts = dict(zip(summary['classes'], summary['counts']))
+    total = summary['counts'].sum()
+    return _class_balance_result(counts, total)
+
+
+def _class_balance_result(counts: Dict, total: int) -> Tuple[bool, str]:
     pct_buy = (counts.get(1, 0) / total * 100) if total > 0 else 0
     pct_hold = (counts.get(0, 0) / total * 100) if total > 0 else 0
     pct_sell = (counts.get(-1, 0) / total * 100) if total > 0 else 0
@@ -92,7 +149,10 @@ def validate_no_duplicates(df: pd.DataFrame) -> Tuple[bool, str]:
         return False, "Columns 'symbol' and 'date' required"
     
     duplicates = df.duplicated(subset=['symbol', 'date']).sum()
-    
+    return _no_duplicates_result(duplicates)
+
+
+def _no_duplicates_result(duplicates: int) -> Tuple[bool, str]:
     if duplicates == 0:
         return True, f"✓ No duplicate (symbol, date) pairs"
     else:
@@ -117,28 +177,40 @@ def validate_class_distribution_per_symbol(df: pd.DataFrame) -> Tuple[bool, str]
     if 'symbol' not in df.columns or 'y_class_1d' not in df.columns:
         return False, "Required columns not found"
     
-    stats = []
-    for symbol in df['symbol'].unique():
-        symbol_df = df[df['symbol'] == symbol]
-        counts = symbol_df['y_class_1d'].value_counts()
-        total = counts.sum()
-        
-        pct_hold = (counts.get(0, 0) / total * 100) if total > 0 else 0
-        stats.append(f"{symbol}: Hold={pct_hold:.1f}%")
+    import pandas as pd
+    
+    # One grouped pass: non-null labels and Hold (0) labels per symbol
+    y = df['y_class_1d']
+    grouped = pd.DataFrame({'total': y.notna(), 'hold': y.eq(0)}).groupby(df['symbol'], sort=False, observed=True).sum()
+    pct_hold = (grouped['hold'] / grouped['total'] * 100).where(grouped['total'] > 0, 0)
+    
+    stats = [f"{symbol}: Hold={pct:.1f}%" for symbol, pct in pct_hold.items()]
     
     return True, f"✓ Per-symbol Hold%: {', '.join(stats)}"
 
 
+# (name, check(df, summary)) in report order; summary is the shared
+# y_class_1d pass from _summarize_targets
+_VALIDATORS = (
+    ('no_nulls', lambda df, summary: validate_no_nulls(df, 252, summary)),
+    ('valid_classes', validate_valid_classes),
+    ('class_balance', validate_class_balance),
+    ('no_duplicates', lambda df, summary: validate_no_duplicates(df)),
+    ('feature_count', lambda df, summary: validate_feature_count(df, 83)),
+    ('per_symbol_distribution', lambda df, summary: validate_class_distribution_per_symbol(df)),
+)
+
+
 def run_all_validations(df: pd.DataFrame) -> Dict[str, Tuple[bool, str]]:
-    """Run all validation checks."""
-    checks = {
-        'no_nulls': validate_no_nulls(df, 252),
-        'valid_classes': validate_valid_classes(df),
-        'class_balance': validate_class_balance(df),
-        'no_duplicates': validate_no_duplicates(df),
-        'feature_count': validate_feature_count(df, 83),
-        'per_symbol_distribution': validate_class_distribution_per_symbol(df),
-    }
+    """Run all validation checks; a check that raises fails on its own."""
+    summary = _summarize_targets(df) if 'y_class_1d' in df.columns else None
+    
+    checks = {}
+    for name, check in _VALIDATORS:
+        try:
+            checks[name] = check(df, summary)
+        except Exception as e:
+            checks[name] = (False, f"✗ {name} failed with error: {e}")
     
     return checks
 
@@ -172,23 +244,37 @@ def print_validation_report(checks: Dict[str, Tuple[bool, str]]):
 
 def load_dataset_from_supabase() -> pd.DataFrame:
     """Load classification dataset from Supabase."""
+    import pandas as pd
+    import pyarrow as pa
+    
     print("Loading classification dataset from Supabase...")
     
-    db = SupabaseDB(
-        url=os.getenv("SUPABASE_URL"),
-        key=os.getenv("SUPABASE_KEY")
-    )
+    db = get_db()
     
-    # Query classification view
-    query = """
-        select * from public.v_classification_dataset_1d
-        order by symbol, date
-    """
-    
-    response = db.client.rpc('exec_sql', {'query': query}).execute()
+    # Page through the classification view so only one page of JSON is held
+    # at a time; each page becomes a columnar Arrow table as soon as it arrives
+    chunks = []
+    offset = 0
+    try:
+        while True:
+            response = db.client.table('v_classification_dataset_1d')\
+                .select('*')\
+                .order('symbol')\
+                .order('date')\
+                .range(offset, offset + PAGE_SIZE - 1)\
+                .execute()
+            if not response.data:
+                break
+            chunks.append(pa.Table.from_pylist(response.data))
+            # Advance by what was returned: the server may cap rows per request
+            offset += len(response.data)
+    except Exception as e:
+        print(f"Error paging v_classification_dataset_1d: {e}")
+        chunks = []
     
-    if response.data:
-        df = pd.DataFrame(response.data)
+    if chunks:
+        # Pages infer their own types (e.g. an all-null column); widen to a common schema
+        df = pa.concat_tables(chunks, promote_options='permissive').to_pandas()
         print(f"Loaded {len(df)} rows, {len(df.columns)} columns")
         return df
     else:
@@ -214,17 +300,75 @@ def load_dataset_from_supabase() -> pd.DataFrame:
             raise Exception("Failed to load dataset from Supabase")
 
 
-def run_sql_validation(db: SupabaseDB):
-    """Run SQL validation function."""
+def fetch_validation_counts(db: SupabaseDB, warmup_days: int = 252) -> Dict:
+    """
+    Aggregate the null/class-balance/duplicate counts in Postgres, so the
+    aggregate checks need one row instead of the whole view.
+    """
+    query = f"""
+        with d as (
+            select symbol, date::date as date, y_class_1d
+            from public.v_classification_dataset_1d
+        ),
+        w as (
+            select min(date) + {int(warmup_days)} as warmup_end from d
+        )
+        select
+            count(*) filter (where d.date > w.warmup_end) as rows_after_warmup,
+            count(*) filter (where d.date > w.warmup_end and d.y_class_1d is null) as nulls_after_warmup,
+            count(d.y_class_1d) as labeled,
+            count(*) filter (where d.y_class_1d = 1) as buy,
+            count(*) filter (where d.y_class_1d = 0) as hold,
+            count(*) filter (where d.y_class_1d = -1) as sell,
+            count(*) - count(distinct (d.symbol, d.date)) as duplicates
+        from d cross join w
+        group by w.warmup_end
+    """
+    response = db.client.rpc('exec_sql', {'query': query}).execute()
+    if not response.data:
+        raise Exception("Failed to fetch validation counts from Supabase")
+    return {k: int(v or 0) for k, v in response.data[0].items()}
+
+
+def run_count_validations(counts: Dict, warmup_days: int = 252) -> Dict[str, Tuple[bool, str]]:
+    """Run the aggregate-only checks on counts from fetch_validation_counts."""
+    return {
+        'no_nulls': _no_nulls_result(counts['nulls_after_warmup'], counts['rows_after_warmup'], warmup_days),
+        'class_balance': _class_balance_result(
+            {1: counts['buy'], 0: counts['hold'], -1: counts['sell']}, counts['labeled']
+        ),
+        'no_duplicates': _no_duplicates_result(counts['duplicates']),
+    }
+
+
+def fetch_sql_validation(db: SupabaseDB):
+    """Call the SQL validation function; returns its rows or the raised exception."""
+    try:
+        return db.client.rpc('validate_classification_dataset_1d').execute().data
+    except Exception as e:
+        return e
+
+
+def run_sql_validation(db: SupabaseDB, pending: Future = None):
+    """
+    Run SQL validation function and print its results.
+    
+    Args:
+        db: Supabase client
+        pending: Future of fetch_sql_validation started earlier (e.g. while the
+            dataset downloads); called synchronously when not given
+    """
     print("\n" + "="*70)
     print("RUNNING SQL VALIDATION FUNCTION")
     print("="*70 + "\n")
     
+    rows = pending.result() if pending is not None else fetch_sql_validation(db)
     try:
-        response = db.client.rpc('validate_classification_dataset_1d').execute()
+        if isinstance(rows, Exception):
+            raise rows
         
-        if response.data:
-            for row in response.data:
+        if rows:
+            for row in rows:
                 status_symbol = "✓" if row['status'] == 'PASS' else ("⚠" if row['status'] == 'WARN' else "✗")
                 print(f"{status_symbol} {row['check_name']:30s} {row['details']}")
         else:
@@ -238,43 +382,57 @@ def main():
     parser.add_argument('--supabase', action='store_true', help='Validate data from Supabase')
     parser.add_argument('--csv', type=str, help='Validate data from CSV file')
     parser.add_argument('--sql-only', action='store_true', help='Run SQL validation only')
+    parser.add_argument('--counts-only', action='store_true',
+                        help='Run null/class-balance/duplicate checks on server-side counts (no dataset download)')
     
     args = parser.parse_args()
     
     if args.sql_only:
         # Run SQL validation function only
-        db = SupabaseDB(
-            url=os.getenv("SUPABASE_URL"),
-            key=os.getenv("SUPABASE_KEY")
-        )
-        run_sql_validation(db)
+        run_sql_validation(get_db())
         sys.exit(0)
     
+    if args.counts_only:
+        checks = run_count_validations(fetch_validation_counts(get_db()))
+        sys.exit(0 if print_validation_report(checks) else 1)
+    
+    import pandas as pd
+    
     # Load dataset
+    pending_sql = None
     if args.supabase:
+        # The SQL validation RPC is independent of the download: overlap the two
+        executor = ThreadPoolExecutor(max_workers=1)
+        pending_sql = executor.submit(fetch_sql_validation, get_db())
+        executor.shutdown(wait=False)
         df = load_dataset_from_supabase()
     elif args.csv:
         print(f"Loading dataset from {args.csv}...")
         df = pd.read_csv(args.csv)
         print(f"Loaded {len(df)} rows, {len(df.columns)} columns")
     else:
-        print("Error: Must specify --supabase, --csv, or --sql-only")
+        print("Error: Must specify --supabase, --csv, --sql-only, or --counts-only")
         print("Usage: python validate_classification_dataset.py --supabase")
         print("   or: python validate_classification_dataset.py --csv path/to/data.csv")
         print("   or: python validate_classification_dataset.py --sql-only")
+        print("   or: python validate_classification_dataset.py --counts-only")
         sys.exit(1)
     
+    # Categorical symbols and parsed dates: groupby/duplicated hash int codes
+    # and timestamps instead of Python strings; a missing column is left for
+    # the validations to report
+    if 'symbol' in df.columns:
+        df['symbol'] = df['symbol'].astype('category')
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    
     # Run Python validations
     checks = run_all_validations(df)
     all_passed = print_validation_report(checks)
     
     # Also run SQL validation if using Supabase
     if args.supabase:
-        db = SupabaseDB(
-            url=os.getenv("SUPABASE_URL"),
-            key=os.getenv("SUPABASE_KEY")
-        )
-        run_sql_validation(db)
+        run_sql_validation(get_db(), pending_sql)
     
     # Exit with appropriate code
     sys.exit(0 if all_passed else 1)
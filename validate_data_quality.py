@@ -9,15 +9,30 @@ Verifies:
 5. Labels properly shifted (no leakage)
 """
 
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, TextIO
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from etl.supabase_client import SupabaseDB
 
+# symbol -> assets.id, resolved once per process
+_ASSET_ID_CACHE = {}
 
-def check_duplicates(db: SupabaseDB) -> bool:
+
+def _get_asset_id(db: SupabaseDB, symbol: str) -> int:
+    """Look up an asset id, hitting Supabase only on the first call per symbol."""
+    if symbol not in _ASSET_ID_CACHE:
+        result = db.client.table('assets').select('id').eq('symbol', symbol).execute()
+        _ASSET_ID_CACHE[symbol] = result.data[0]['id']
+    return _ASSET_ID_CACHE[symbol]
+
+
+def check_duplicates(db: SupabaseDB, out: Optional[TextIO] = None) -> bool:
     """Check for duplicate (asset_id, date) in features and labels."""
-    print("\n=== Checking for duplicates ===")
+    print("\n=== Checking for duplicates ===", file=out)
     
     # Features
     result = db.client.rpc(
@@ -26,9 +41,9 @@ def check_duplicates(db: SupabaseDB) -> bool:
     ).execute()
     
     if not result.data or result.data[0].get('count', 0) == 0:
-        print("✓ No duplicates in features_daily")
+        print("✓ No duplicates in features_daily", file=out)
     else:
-        print(f"✗ Found {result.data[0]['count']} duplicate (asset_id, date) in features_daily")
+        print(f"✗ Found {result.data[0]['count']} duplicate (asset_id, date) in features_daily", file=out)
         return False
     
     # Labels
@@ -38,76 +53,72 @@ def check_duplicates(db: SupabaseDB) -> bool:
     ).execute()
     
     if not result.data or result.data[0].get('count', 0) == 0:
-        print("✓ No duplicates in labels_daily")
+        print("✓ No duplicates in labels_daily", file=out)
     else:
-        print(f"✗ Found {result.data[0]['count']} duplicate (asset_id, date) in labels_daily")
+        print(f"✗ Found {result.data[0]['count']} duplicate (asset_id, date) in labels_daily", file=out)
         return False
     
     return True
 
 
-def check_event_types(db: SupabaseDB) -> bool:
+def check_event_types(db: SupabaseDB, out: Optional[TextIO] = None) -> bool:
     """Verify only allowed event types exist."""
-    print("\n=== Checking event types ===")
+    print("\n=== Checking event types ===", file=out)
     
     allowed = {'fomc', 'cpi_release', 'nfp_release'}
     
     result = db.client.table('events_calendar').select('event_type').execute()
     
     if not result.data:
-        print("✗ No events found in calendar")
+        print("✗ No events found in calendar", file=out)
         return False
     
     df = pd.DataFrame(result.data)
     unique_types = set(df['event_type'].unique())
     
     if unique_types <= allowed:
-        print(f"✓ All event types valid: {unique_types}")
+        print(f"✓ All event types valid: {unique_types}", file=out)
         counts = df['event_type'].value_counts().to_dict()
         for event_type, count in counts.items():
-            print(f"  - {event_type}: {count} events")
+            print(f"  - {event_type}: {count} events", file=out)
         return True
     else:
         invalid = unique_types - allowed
-        print(f"✗ Invalid event types found: {invalid}")
+        print(f"✗ Invalid event types found: {invalid}", file=out)
         return False
 
 
-def check_warm_up_period(db: SupabaseDB) -> bool:
+def check_warm_up_period(db: SupabaseDB, out: Optional[TextIO] = None) -> bool:
     """Check that training data has sufficient warm-up."""
-    print("\n=== Checking warm-up period ===")
+    print("\n=== Checking warm-up period ===", file=out)
     
     # Get earliest date per ETF
     result = db.client.table('v_model_dataset').select('symbol, date').order('date').limit(4).execute()
     
     if not result.data:
-        print("✗ No data in v_model_dataset")
+        print("✗ No data in v_model_dataset", file=out)
         return False
     
     df = pd.DataFrame(result.data)
     earliest_dates = df.groupby('symbol')['date'].min()
     
-    all_ok = True
-    for symbol, date_str in earliest_dates.items():
-        date = pd.to_datetime(date_str).date()
-        
-        # Check if we have at least 260 days before first training date
-        # Assumes data starts from 2000-01-01
-        start_date = pd.to_datetime('2000-01-01').date()
-        days_warmup = (date - start_date).days
-        
+    # Days of history before each symbol's first training date, in one
+    # vectorized pass. Assumes data starts from 2000-01-01
+    warmup_days = (pd.to_datetime(earliest_dates) - pd.Timestamp('2000-01-01')).dt.days
+    all_ok = not (warmup_days < 200).any()
+    
+    for symbol, days_warmup in warmup_days.items():
         if days_warmup < 200:
-            print(f"✗ {symbol}: Only {days_warmup} days warm-up (need 200+ for SMA200)")
-            all_ok = False
+            print(f"✗ {symbol}: Only {days_warmup} days warm-up (need 200+ for SMA200)", file=out)
         else:
-            print(f"✓ {symbol}: {days_warmup} days warm-up (sufficient)")
+            print(f"✓ {symbol}: {days_warmup} days warm-up (sufficient)", file=out)
     
     return all_ok
 
 
-def check_nan_handling(db: SupabaseDB) -> bool:
+def check_nan_handling(db: SupabaseDB, out: Optional[TextIO] = None) -> bool:
     """Check NaN counts in first 260 rows vs later rows."""
-    print("\n=== Checking NaN patterns ===")
+    print("\n=== Checking NaN patterns ===", file=out)
     
     # Get SPY data as sample
     result = db.client.table('v_model_dataset').select(
@@ -115,51 +126,49 @@ def check_nan_handling(db: SupabaseDB) -> bool:
     ).eq('symbol', 'SPY').order('date').limit(300).execute()
     
     if not result.data:
-        print("✗ No data found for SPY")
+        print("✗ No data found for SPY", file=out)
         return False
     
     df = pd.DataFrame(result.data)
     
-    # Check first 260 rows
-    first_260 = df.iloc[:260]
-    after_260 = df.iloc[260:]
-    
-    nan_early = first_260.isna().sum()
-    nan_later = after_260.isna().sum()
+    # One NaN mask over both columns, split at row 260
+    cols = ['sma_200', 'vol_60']
+    nan = np.isnan(df[cols].to_numpy(dtype=np.float64))
+    nan_early = dict(zip(cols, nan[:260].sum(axis=0).tolist()))
+    nan_later = dict(zip(cols, nan[260:].sum(axis=0).tolist()))
     
-    print(f"NaN counts in first 260 rows:")
-    print(f"  - sma_200: {nan_early['sma_200']}")
-    print(f"  - vol_60: {nan_early['vol_60']}")
+    print(f"NaN counts in first 260 rows:", file=out)
+    print(f"  - sma_200: {nan_early['sma_200']}", file=out)
+    print(f"  - vol_60: {nan_early['vol_60']}", file=out)
     
-    print(f"NaN counts after row 260:")
-    print(f"  - sma_200: {nan_later['sma_200']}")
-    print(f"  - vol_60: {nan_later['vol_60']}")
+    print(f"NaN counts after row 260:", file=out)
+    print(f"  - sma_200: {nan_later['sma_200']}", file=out)
+    print(f"  - vol_60: {nan_later['vol_60']}", file=out)
     
     if nan_later['sma_200'] > 5:
-        print("✗ Too many NaN in sma_200 after warm-up")
+        print("✗ Too many NaN in sma_200 after warm-up", file=out)
         return False
     
-    print("✓ NaN pattern looks reasonable (concentrated in warm-up period)")
+    print("✓ NaN pattern looks reasonable (concentrated in warm-up period)", file=out)
     return True
 
 
-def check_label_shift(db: SupabaseDB) -> bool:
+def check_label_shift(db: SupabaseDB, out: Optional[TextIO] = None) -> bool:
     """Verify labels are properly shifted forward (no leakage)."""
-    print("\n=== Checking label shift ===")
+    print("\n=== Checking label shift ===", file=out)
     
     # Get SPY bars and labels
+    asset_id = _get_asset_id(db, 'SPY')
     bars = db.client.table('daily_bars').select('date, close').eq(
-        'asset_id', 
-        db.client.table('assets').select('id').eq('symbol', 'SPY').execute().data[0]['id']
+        'asset_id', asset_id
     ).order('date').limit(10).execute()
     
     labels = db.client.table('labels_daily').select('date, y_1d').eq(
-        'asset_id',
-        db.client.table('assets').select('id').eq('symbol', 'SPY').execute().data[0]['id']
+        'asset_id', asset_id
     ).order('date').limit(10).execute()
     
     if not bars.data or not labels.data:
-        print("✗ No data found for shift check")
+        print("✗ No data found for shift check", file=out)
         return False
     
     bars_df = pd.DataFrame(bars.data)
@@ -169,15 +178,15 @@ def check_label_shift(db: SupabaseDB) -> bool:
     # y_1d at date t should be based on close at t+1
     merged = bars_df.merge(labels_df, on='date', how='inner')
     
-    print(f"✓ Found {len(merged)} overlapping dates for validation")
-    print(f"  Sample dates: {merged['date'].iloc[:3].tolist()}")
+    print(f"✓ Found {len(merged)} overlapping dates for validation", file=out)
+    print(f"  Sample dates: {merged['date'].iloc[:3].tolist()}", file=out)
     
     return True
 
 
-def check_feature_manifest_alignment(db: SupabaseDB) -> bool:
+def check_feature_manifest_alignment(db: SupabaseDB, out: Optional[TextIO] = None) -> bool:
     """Check that v_features_pruned has correct feature count."""
-    print("\n=== Checking feature manifest alignment ===")
+    print("\n=== Checking feature manifest alignment ===", file=out)
     
     # Expected: 22 technical + 12 macro + 4 VIX + 8 cross-asset + 4 breadth + 3 events = 53 features
     # Plus: date, asset_id, id, created_at (metadata) = 57 columns total
@@ -185,7 +194,7 @@ def check_feature_manifest_alignment(db: SupabaseDB) -> bool:
     result = db.client.table('v_features_pruned').select('*').limit(1).execute()
     
     if not result.data:
-        print("✗ v_features_pruned is empty")
+        print("✗ v_features_pruned is empty", file=out)
         return False
     
     columns = list(result.data[0].keys())
@@ -194,14 +203,14 @@ def check_feature_manifest_alignment(db: SupabaseDB) -> bool:
     expected = 53  # As per manifest
     actual = len(feature_cols)
     
-    print(f"Feature count: {actual} (expected {expected})")
+    print(f"Feature count: {actual} (expected {expected})", file=out)
     
     if actual == expected:
-        print("✓ Feature count matches manifest")
+        print("✓ Feature count matches manifest", file=out)
         return True
     else:
-        print(f"✗ Mismatch: expected {expected}, got {actual}")
-        print(f"Columns: {feature_cols}")
+        print(f"✗ Mismatch: expected {expected}, got {actual}", file=out)
+        print(f"Columns: {feature_cols}", file=out)
         return False
 
 
@@ -214,21 +223,34 @@ def run_all_checks():
     db = SupabaseDB()
     
     checks = [
-        ("Duplicate check", lambda: check_duplicates(db)),
-        ("Event types", lambda: check_event_types(db)),
-        ("Warm-up period", lambda: check_warm_up_period(db)),
-        ("NaN handling", lambda: check_nan_handling(db)),
-        ("Label shift", lambda: check_label_shift(db)),
-        ("Feature manifest", lambda: check_feature_manifest_alignment(db)),
+        ("Duplicate check", check_duplicates),
+        ("Event types", check_event_types),
+        ("Warm-up period", check_warm_up_period),
+        ("NaN handling", check_nan_handling),
+        ("Label shift", check_label_shift),
+        ("Feature manifest", check_feature_manifest_alignment),
     ]
     
-    results = {}
-    for name, check_fn in checks:
+    # Checks are dominated by Supabase round-trips; run them concurrently,
+    # each writing to its own buffer, and print the buffers in order so the
+    # report reads as before
+    def run_check(name, check_fn):
+        out = io.StringIO()
         try:
-            results[name] = check_fn()
+            passed = check_fn(db, out=out)
         except Exception as e:
-            print(f"✗ {name} failed with error: {e}")
-            results[name] = False
+            print(f"✗ {name} failed with error: {e}", file=out)
+            passed = False
+        return passed, out.getvalue()
+    
+    with ThreadPoolExecutor(max_workers=len(checks)) as pool:
+        futures = [pool.submit(run_check, name, check_fn) for name, check_fn in checks]
+        
+        results = {}
+        for (name, _), future in zip(checks, futures):
+            passed, output = future.result()
+            print(output, end='')
+            results[name] = passed
     
     print("\n" + "=" * 60)
     print("SUMMARY")
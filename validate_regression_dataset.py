@@ -15,13 +15,23 @@ Usage:
 Date: 2025-12-13
 """
 
+import io
 import os
 import sys
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from typing import Dict, List, Tuple
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -32,30 +42,155 @@ from etl.transform_normalization import validate_feature_distributions, BINARY_F
 # Expected feature count (after redundancy removal)
 EXPECTED_FEATURE_COUNT = 83  # Updated count after optimization
 
+# Non-feature columns of the dataset
+METADATA_COLUMNS = ['symbol', 'date', 'primary_target', 'asset_id']
+
 # Symbols to validate
 SYMBOLS = ['SPY', 'QQQ', 'DIA', 'IWM']
 
+# Rows per request when paging Supabase views (PostgREST's default max-rows)
+PAGE_SIZE = 1000
+
 # Warm-up period (days to ignore for NaN checks)
 WARMUP_DAYS = 252
 
+# Per-symbol target variance at or below this counts as zero
+ZERO_VARIANCE_EPS = 1e-20
+
+
+if njit is not None:
+    # Parallel over symbol slices. Launch it from the main thread only: a
+    # parallel region started on a worker thread leaves numba's default
+    # workqueue layer hung at interpreter exit. run_all_validations calls
+    # summarize_target before it starts its thread pool
+    @njit(parallel=True, cache=True)
+    def _summarize_target_slices(values, after_warmup, offsets, clip, out):
+        """
+        One pass per offsets slice: Welford count/mean/M2 of the non-NaN
+        values, NaN and total rows after warm-up, and |value| > clip rows.
+        """
+        for k in prange(len(offsets) - 1):
+            n = 0
+            mean = 0.0
+            m2 = 0.0
+            nan_after = 0
+            rows_after = 0
+            outliers = 0
+            for i in range(offsets[k], offsets[k + 1]):
+                x = values[i]
+                if after_warmup[i]:
+                    rows_after += 1
+                if np.isnan(x):
+                    if after_warmup[i]:
+                        nan_after += 1
+                    continue
+                if abs(x) > clip:
+                    outliers += 1
+                n += 1
+                delta = x - mean
+                mean += delta / n
+                m2 += delta * (x - mean)
+            out[k, 0] = n
+            out[k, 1] = mean if n > 0 else np.nan
+            out[k, 2] = m2
+            out[k, 3] = nan_after
+            out[k, 4] = rows_after
+            out[k, 5] = outliers
+
+
+def summarize_target(df: pd.DataFrame, warmup_days: int = WARMUP_DAYS) -> Dict:
+    """
+    Everything the primary_target checks need, from one scan of the column.
+    
+    With numba installed and on the main thread this is a single compiled
+    pass over the symbol-grouped target (Welford count/mean/M2 per symbol
+    plus the NaN and outlier counters); otherwise NumPy counts and a
+    two-pass groupby.
+    
+    Args:
+        df: Dataset with primary_target (symbol and parsed date if present)
+        warmup_days: Days after the first date excluded from the NaN count
+    
+    Returns:
+        Dict with per_symbol (DataFrame of count, mean, m2 indexed by symbol
+        in order of first appearance; NaN symbols dropped), nan_after_warmup,
+        rows_after_warmup and outliers (rows with |primary_target| > 3)
+    """
+    values = df['primary_target'].to_numpy(dtype=np.float64, na_value=np.nan)
+    if 'date' in df.columns:
+        warmup_end = df['date'].min() + pd.Timedelta(days=warmup_days)
+        # Series comparison: an empty frame's NaT warm-up end just yields no rows
+        after_warmup = (df['date'] > warmup_end).to_numpy()
+    else:
+        after_warmup = np.zeros(len(values), dtype=bool)
+    
+    # The parallel kernel must not start on a worker thread (see
+    # _summarize_target_slices), e.g. a validator called without a summary
+    # from someone else's pool: use the NumPy/groupby path there instead
+    if njit is None or threading.current_thread() is not threading.main_thread():
+        per_symbol = pd.DataFrame(columns=['count', 'mean', 'm2'])
+        if 'symbol' in df.columns:
+            target = pd.Series(values, index=df.index)
+            grouped = target.groupby(df['symbol'], sort=False, observed=True)
+            sq_dev = (target - grouped.transform('mean')) ** 2
+            per_symbol = sq_dev.groupby(df['symbol'], sort=False, observed=True).agg(['count', 'sum'])
+            per_symbol['mean'] = grouped.mean()
+            per_symbol = per_symbol.rename(columns={'sum': 'm2'})[['count', 'mean', 'm2']]
+        return {
+            'per_symbol': per_symbol,
+            'nan_after_warmup': int(np.count_nonzero(np.isnan(values) & after_warmup)),
+            'rows_after_warmup': int(np.count_nonzero(after_warmup)),
+            # NaN compares False
+            'outliers': int(np.count_nonzero(np.abs(values) > 3.0)),
+        }
+    
+    if 'symbol' in df.columns:
+        codes, symbols = pd.factorize(df['symbol'], sort=False)
+    else:
+        codes, symbols = np.full(len(values), -1, dtype=np.intp), pd.Index([])
+    # Slice 0 holds NaN-symbol rows: counted in the totals, not per symbol
+    codes = codes + 1
+    
+    # Rows arrive sorted by symbol, in which case no gather is needed
+    if len(codes) and not np.all(codes[1:] >= codes[:-1]):
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        values = values[order]
+        after_warmup = after_warmup[order]
+    offsets = np.searchsorted(codes, np.arange(len(symbols) + 2)).astype(np.int64)
+    
+    out = np.empty((len(symbols) + 1, 6), dtype=np.float64)
+    _summarize_target_slices(values, after_warmup, offsets, 3.0, out)
+    
+    per_symbol = pd.DataFrame(out[1:, :3], index=pd.Index(symbols, name='symbol'), columns=['count', 'mean', 'm2'])
+    per_symbol['count'] = per_symbol['count'].astype(np.int64)
+    totals = out[:, 3:].sum(axis=0)
+    return {
+        'per_symbol': per_symbol,
+        'nan_after_warmup': int(totals[0]),
+        'rows_after_warmup': int(totals[1]),
+        'outliers': int(totals[2]),
+    }
+
 
-def validate_no_nans(df: pd.DataFrame, warmup_days: int = 252) -> Tuple[bool, str]:
+def validate_no_nans(df: pd.DataFrame, warmup_days: int = 252, summary: Dict = None) -> Tuple[bool, str]:
     """
     Check for NaN in primary_target beyond warm-up period.
     
+    Args:
+        summary: summarize_target(df, warmup_days), if already computed
+    
     Returns:
         (pass: bool, message: str)
     """
     if 'primary_target' not in df.columns:
         return False, "Column 'primary_target' not found in dataset"
     
-    # Skip warm-up period
-    min_date = df['date'].min()
-    warmup_end = pd.to_datetime(min_date) + pd.Timedelta(days=warmup_days)
-    df_after_warmup = df[pd.to_datetime(df['date']) > warmup_end]
-    
-    nan_count = df_after_warmup['primary_target'].isna().sum()
-    total_rows = len(df_after_warmup)
+    # Skip warm-up period (date is parsed once in main)
+    if summary is None:
+        summary = summarize_target(df, warmup_days)
+    nan_count = summary['nan_after_warmup']
+    total_rows = summary['rows_after_warmup']
     
     if nan_count == 0:
         return True, f"✓ No NaN in primary_target after {warmup_days}-day warm-up ({total_rows} rows checked)"
@@ -74,7 +209,18 @@ def validate_no_duplicates(df: pd.DataFrame) -> Tuple[bool, str]:
     if 'symbol' not in df.columns or 'date' not in df.columns:
         return False, "Columns 'symbol' and 'date' required"
     
-    duplicates = df.duplicated(subset=['symbol', 'date']).sum()
+    # The view comes back ordered by (symbol, date): when each symbol's rows
+    # are contiguous and date-sorted, duplicates can only be adjacent, so one
+    # neighbour comparison replaces the hash table. Otherwise hash as before
+    symbol = df['symbol'].to_numpy()
+    date = df['date'].to_numpy()
+    same_symbol = symbol[1:] == symbol[:-1]
+    n_runs = len(same_symbol) - int(np.count_nonzero(same_symbol)) + 1
+    if (n_runs == df['symbol'].nunique(dropna=False)
+            and np.all(date[1:][same_symbol] >= date[:-1][same_symbol])):
+        duplicates = int(np.count_nonzero(same_symbol & (date[1:] == date[:-1])))
+    else:
+        duplicates = int(df.duplicated(subset=['symbol', 'date']).sum())
     
     if duplicates == 0:
         return True, f"✓ No duplicate (symbol, date) pairs"
@@ -82,23 +228,28 @@ def validate_no_duplicates(df: pd.DataFrame) -> Tuple[bool, str]:
         return False, f"✗ Found {duplicates} duplicate (symbol, date) pairs"
 
 
-def validate_target_variance(df: pd.DataFrame) -> Tuple[bool, str]:
+def validate_target_variance(df: pd.DataFrame, summary: Dict = None) -> Tuple[bool, str]:
     """
     Check that target variance is non-zero per symbol.
     
+    Args:
+        summary: summarize_target(df), if already computed
+    
     Returns:
         (pass: bool, message: str)
     """
     if 'symbol' not in df.columns or 'primary_target' not in df.columns:
         return False, "Columns 'symbol' and 'primary_target' required"
     
-    zero_var_symbols = []
-    for symbol in df['symbol'].unique():
-        symbol_data = df[df['symbol'] == symbol]['primary_target'].dropna()
-        if len(symbol_data) > 1:
-            var = symbol_data.var()
-            if var == 0 or pd.isna(var):
-                zero_var_symbols.append(symbol)
+    # M2 is accumulated around each symbol's own mean (Welford or two-pass),
+    # so a near-constant target is not rounded to exactly 0 (or below) by a
+    # sum-of-squares formula. Symbols with fewer than 2 non-null targets are skipped
+    if summary is None:
+        summary = summarize_target(df)
+    stats = summary['per_symbol']
+    var = stats['m2'] / (stats['count'] - 1)
+    zero_var = (stats['count'] > 1) & ((var <= ZERO_VARIANCE_EPS) | var.isna())
+    zero_var_symbols = stats.index[zero_var].tolist()
     
     if len(zero_var_symbols) == 0:
         return True, f"✓ All {len(df['symbol'].unique())} symbols have non-zero target variance"
@@ -106,16 +257,23 @@ def validate_target_variance(df: pd.DataFrame) -> Tuple[bool, str]:
         return False, f"✗ Symbols with zero variance: {zero_var_symbols}"
 
 
-def validate_feature_count(df: pd.DataFrame, expected: int) -> Tuple[bool, str]:
+def get_feature_columns(df: pd.DataFrame) -> List[str]:
+    """Dataset columns that are features (everything but METADATA_COLUMNS)."""
+    return [c for c in df.columns if c not in METADATA_COLUMNS]
+
+
+def validate_feature_count(df: pd.DataFrame, expected: int, feature_cols: List[str] = None) -> Tuple[bool, str]:
     """
     Check that feature count matches expected.
     
+    Args:
+        feature_cols: Precomputed get_feature_columns(df), if available
+    
     Returns:
         (pass: bool, message: str)
     """
-    # Exclude metadata columns
-    feature_cols = [c for c in df.columns 
-                   if c not in ['symbol', 'date', 'primary_target', 'asset_id']]
+    if feature_cols is None:
+        feature_cols = get_feature_columns(df)
     
     actual = len(feature_cols)
     
@@ -125,10 +283,13 @@ def validate_feature_count(df: pd.DataFrame, expected: int) -> Tuple[bool, str]:
         return False, f"⚠ Feature count mismatch: expected {expected}, got {actual}"
 
 
-def validate_no_extreme_outliers(df: pd.DataFrame) -> Tuple[bool, str]:
+def validate_no_extreme_outliers(df: pd.DataFrame, summary: Dict = None) -> Tuple[bool, str]:
     """
     Check for extreme outliers beyond clipping thresholds.
     
+    Args:
+        summary: summarize_target(df), if already computed
+    
     Returns:
         (pass: bool, message: str)
     """
@@ -136,7 +297,9 @@ def validate_no_extreme_outliers(df: pd.DataFrame) -> Tuple[bool, str]:
         return False, "Column 'primary_target' not found"
     
     # Primary target should be clipped to ±3
-    extreme = (df['primary_target'].abs() > 3.0).sum()
+    if summary is None:
+        summary = summarize_target(df)
+    extreme = summary['outliers']
     
     if extreme == 0:
         return True, f"✓ No extreme outliers in primary_target (all within ±3)"
@@ -154,8 +317,8 @@ def validate_date_range(df: pd.DataFrame, min_years: int = 10) -> Tuple[bool, st
     if 'date' not in df.columns:
         return False, "Column 'date' not found"
     
-    min_date = pd.to_datetime(df['date'].min())
-    max_date = pd.to_datetime(df['date'].max())
+    min_date = df['date'].min()
+    max_date = df['date'].max()
     days = (max_date - min_date).days
     years = days / 365.25
     
@@ -203,34 +366,46 @@ def run_all_validations(df: pd.DataFrame) -> Dict[str, Tuple[bool, str]]:
     Returns:
         Dictionary of check_name -> (pass, message)
     """
-    checks = {
-        'no_nans': validate_no_nans(df, WARMUP_DAYS),
-        'no_duplicates': validate_no_duplicates(df),
-        'target_variance': validate_target_variance(df),
-        'feature_count': validate_feature_count(df, EXPECTED_FEATURE_COUNT),
-        'no_extreme_outliers': validate_no_extreme_outliers(df),
-        'date_range': validate_date_range(df, min_years=10),
-        'feature_distributions': validate_feature_distributions_check(df),
+    feature_cols = get_feature_columns(df)
+    # One fused scan of primary_target shared by the NaN, variance and outlier checks
+    target_summary = summarize_target(df, WARMUP_DAYS) if 'primary_target' in df.columns else None
+    
+    validators = {
+        'no_nans': lambda: validate_no_nans(df, WARMUP_DAYS, target_summary),
+        'no_duplicates': lambda: validate_no_duplicates(df),
+        'target_variance': lambda: validate_target_variance(df, target_summary),
+        'feature_count': lambda: validate_feature_count(df, EXPECTED_FEATURE_COUNT, feature_cols),
+        'no_extreme_outliers': lambda: validate_no_extreme_outliers(df, target_summary),
+        'date_range': lambda: validate_date_range(df, min_years=10),
+        'feature_distributions': lambda: validate_feature_distributions_check(df),
     }
     
+    # Checks only read df and spend their time in NumPy/pandas kernels that
+    # release the GIL, so they run side by side; results keep report order
+    with ThreadPoolExecutor(max_workers=min(8, len(validators))) as executor:
+        futures = {name: executor.submit(check) for name, check in validators.items()}
+        checks = {name: future.result() for name, future in futures.items()}
+    
     return checks
 
 
 def print_validation_report(checks: Dict[str, Tuple[bool, str]]):
     """
     Print formatted validation report.
+    
+    The report is built in a buffer and written once, so it never
+    interleaves with output from other threads.
     """
-    print("\n" + "="*70)
-    print("REGRESSION DATASET VALIDATION REPORT")
-    print("="*70 + "\n")
+    buf = io.StringIO()
+    buf.write("\n" + "="*70 + "\n")
+    buf.write("REGRESSION DATASET VALIDATION REPORT\n")
+    buf.write("="*70 + "\n\n")
     
     passed = 0
     failed = 0
     warned = 0
     
     for check_name, (success, message) in checks.items():
-        status_symbol = "✓" if success else ("⚠" if message.startswith("⚠") else "✗")
-        
         if success:
             passed += 1
         elif message.startswith("⚠"):
@@ -238,11 +413,13 @@ def print_validation_report(checks: Dict[str, Tuple[bool, str]]):
         else:
             failed += 1
         
-        print(f"{check_name:25s} {message}")
+        buf.write(f"{check_name:25s} {message}\n")
     
-    print("\n" + "-"*70)
-    print(f"SUMMARY: {passed} passed, {failed} failed, {warned} warnings")
-    print("="*70 + "\n")
+    buf.write("\n" + "-"*70 + "\n")
+    buf.write(f"SUMMARY: {passed} passed, {failed} failed, {warned} warnings\n")
+    buf.write("="*70 + "\n\n")
+    
+    sys.stdout.write(buf.getvalue())
     
     return failed == 0
 
@@ -258,16 +435,39 @@ def load_dataset_from_supabase() -> pd.DataFrame:
         key=os.getenv("SUPABASE_KEY")
     )
     
-    # Query optimized view
-    query = """
-        select * from public.v_regression_dataset_optimized
-        order by symbol, date
-    """
-    
-    response = db.client.rpc('exec_sql', {'query': query}).execute()
-    
-    if response.data:
-        df = pd.DataFrame(response.data)
+    # Stream the optimized view one symbol (and one page) at a time, so only
+    # a page is alive at once. Pages are requested as CSV and parsed straight
+    # into columnar Arrow tables: no per-row JSON dicts on the client
+    session = db.client.postgrest.session
+    convert_options = pacsv.ConvertOptions(column_types={'symbol': pa.string(), 'date': pa.string()})
+    chunks = []
+    for symbol in sorted(SYMBOLS):
+        offset = 0
+        while True:
+            response = session.get(
+                'v_regression_dataset_optimized',
+                params={
+                    'select': '*',
+                    'symbol': f'eq.{symbol}',
+                    'order': 'date',
+                    'offset': offset,
+                    'limit': PAGE_SIZE,
+                },
+                headers={'Accept': 'text/csv'},
+            )
+            response.raise_for_status()
+            if not response.content.strip():
+                break
+            page = pacsv.read_csv(pa.py_buffer(response.content), convert_options=convert_options)
+            if page.num_rows == 0:
+                break
+            chunks.append(page)
+            # Advance by what was returned: the server may cap rows per request
+            offset += page.num_rows
+    
+    if chunks:
+        # Pages infer their own types (e.g. an all-null column); widen to a common schema
+        df = pa.concat_tables(chunks, promote_options='permissive').to_pandas()
         print(f"Loaded {len(df)} rows, {len(df.columns)} columns")
         return df
     else:
@@ -294,6 +494,16 @@ def main():
         print("   or: python validate_regression_dataset.py --csv path/to/data.csv")
         sys.exit(1)
     
+    # Parse dates once; the validators compare the typed column directly.
+    # Categorical symbols let duplicated/groupby hash int codes, not strings
+    df['date'] = pd.to_datetime(df['date'], format='ISO8601', cache=True)
+    df['symbol'] = df['symbol'].astype('category')
+    
+    # Features only feed ±3/±5/NaN checks: float32 halves the frame.
+    # primary_target stays float64 for the variance check
+    float_features = [c for c in get_feature_columns(df) if pd.api.types.is_float_dtype(df[c])]
+    df = df.astype(dict.fromkeys(float_features, np.float32), copy=False)
+    
     # Run validations
     checks = run_all_validations(df)
     
@@ -1,4 +1,6 @@
 """Verify predictions for all symbols."""
+import sys
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -6,25 +8,39 @@ from etl.supabase_client import SupabaseDB
 
 SYMBOLS = ['SPY', 'QQQ', 'IWM', 'DIA']
 
+# Latest predictions to show per symbol
+LATEST_N = 6
+
 db = SupabaseDB()
 
 print("\n=== Latest Predictions by Symbol ===\n")
 
+# One round-trip for every symbol: row_number() keeps the per-symbol limit
+# that a single REST .limit() cannot express
+symbol_list = ", ".join(f"'{s}'" for s in SYMBOLS)
+query = f"""
+    select symbol, date, horizon, pred_class_final, confidence
+    from (
+        select symbol, date, horizon, pred_class_final, confidence,
+               row_number() over (partition by symbol order by date desc, horizon) as rn
+        from public.model_predictions_classification
+        where symbol in ({symbol_list})
+    ) latest
+    where rn <= {LATEST_N}
+    order by symbol, date desc, horizon
+"""
+result = db.client.rpc('exec_sql', {'query': query}).execute()
+
+by_symbol = {symbol: [] for symbol in SYMBOLS}
+for row in result.data or []:
+    by_symbol[row['symbol']].append(row)
+
+# One write per symbol block rather than one print per row
 for symbol in SYMBOLS:
-    result = db.client.table('model_predictions_classification')\
-        .select('date, horizon, pred_class_final, confidence')\
-        .eq('symbol', symbol)\
-        .order('date', desc=True)\
-        .limit(6)\
-        .execute()
-    
-    print(f"{symbol}:")
-    if result.data:
-        for row in result.data:
-            direction = "UP" if row['pred_class_final'] == 1 else "DOWN"
-            print(f"  {row['date']} | {row['horizon']} | {direction} | Conf: {row['confidence']:.3f}")
-    else:
-        print(f"  No predictions found")
-    print()
+    lines = [
+        f"  {row['date']} | {row['horizon']} | {'UP' if row['pred_class_final'] == 1 else 'DOWN'} | Conf: {row['confidence']:.3f}"
+        for row in by_symbol[symbol]
+    ] or ["  No predictions found"]
+    sys.stdout.write(f"{symbol}:\n" + "\n".join(lines) + "\n\n")
 
 db.close()
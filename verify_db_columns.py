@@ -11,12 +11,38 @@ from etl.supabase_client import SupabaseDB
 
 load_dotenv()
 
+# Fields printed in the sample; only these are fetched
+SAMPLE_COLUMNS = ['symbol', 'p_buy', 'p_sell', 'p_hold', 'confidence']
+
+_TABLE_COLUMNS = {}
+
+
+def get_table_columns(db, table):
+    """Column names of a public table from information_schema, looked up once per table."""
+    if table not in _TABLE_COLUMNS:
+        query = f"""
+            select column_name
+            from information_schema.columns
+            where table_schema = 'public' and table_name = '{table}'
+            order by ordinal_position
+        """
+        response = db.client.rpc('exec_sql', {'query': query}).execute()
+        _TABLE_COLUMNS[table] = [row['column_name'] for row in response.data or []]
+    return _TABLE_COLUMNS[table]
+
+
 def verify():
     db = SupabaseDB()
+    columns = get_table_columns(db, "model_predictions_classification")
+    print("Columns found:", columns)
+    
     print("Fetching last 5 rows from model_predictions_classification...")
     
+    # Narrow select: columns missing from the schema (e.g. the 3-class
+    # probabilities after the binary migration) would make PostgREST reject it
+    wanted = [c for c in SAMPLE_COLUMNS if c in columns] or ['symbol']
     response = db.client.table("model_predictions_classification")\
-        .select("*")\
+        .select(",".join(wanted))\
         .order("date", desc=True)\
         .limit(5)\
         .execute()
@@ -27,7 +53,6 @@ def verify():
         
     print(f"Found {len(response.data)} rows.")
     first_row = response.data[0]
-    print("Columns found:", list(first_row.keys()))
     
     print("\nSample Data (Probabilities):")
     print(f"Symbol: {first_row.get('symbol')}")